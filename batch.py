@@ -0,0 +1,212 @@
+'''Run quantify over whole folders of files from the command line, spread across worker processes.
+
+Usage:
+python batch.py validate path/to/xyz/files --output graph_results.csv
+python batch.py analyze path/to/trees --output path/to/results
+python batch.py series path/to/trees --output path/to/results
+'''
+
+import argparse
+import csv
+import glob
+import os
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from pathlib import Path
+
+# no display on a server: draw plots straight to file
+import matplotlib
+matplotlib.use('Agg')
+
+import quantify
+from cache import ResultCache
+
+# most deferred plots waiting to be drawn at once, so a slow plotter can't pile up every plant's random trees
+MAX_PENDING_PLOTS = 64
+
+
+def find_files(sources, pattern):
+    '''Expand directories (to the files in them matching pattern) and globs into a sorted list of paths.'''
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            paths.update(Path(source).glob(pattern))
+        else:
+            paths.update(Path(p) for p in glob.glob(source))
+    return sorted(paths)
+
+
+def run_parallel(func, paths, workers, chunksize=None):
+    '''
+    Map func over paths on a pool of worker processes (None for one per CPU), yielding the
+    results in order, as soon as each is ready.
+    '''
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1:
+        yield from map(func, paths)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # by default, hand out files a few at a time, so workers stay busy without a round trip per file
+        if chunksize is None:
+            chunksize = max(1, len(paths) // (4 * workers))
+        yield from pool.map(func, paths, chunksize=chunksize)
+
+
+def validate(args):
+    '''Check every .xyz file in strict mode and write the file,is_intact,details report.'''
+    paths = find_files(args.sources, args.pattern)
+    results = list(run_parallel(quantify.validate, paths, args.workers))
+
+    with open(args.output, 'w', encoding='utf-8', newline='') as csvfile:
+        w = csv.writer(csvfile)
+        w.writerow(['file', 'is_intact', 'details'])
+        for path, (is_intact, details) in zip(paths, results):
+            w.writerow([path.name, is_intact, details])
+
+    broken = sum(1 for is_intact, _ in results if is_intact != 'y')
+    print(f'{len(paths) - broken}/{len(paths)} files intact; wrote report to {args.output}')
+
+
+def analyze_one(path, output_path, adaptive=False, cache=None, plots='inline'):
+    '''
+    Analyze one tree, returning (results, plot, None), or (None, None, error) if it fails.
+    The Pareto plot is drawn here if plots is 'inline'. If it is 'deferred', the quantify.ParetoPlot
+    is returned as plot to be drawn elsewhere, and otherwise there is no plot.
+    '''
+    try:
+        results, plot = quantify.measure_file(path, output_path, adaptive=adaptive, cache=cache)
+        if plots == 'inline':
+            quantify.plot_all(*plot)
+        if plots != 'deferred':
+            plot = None
+        return results, plot, None
+    except Exception:
+        return None, None, traceback.format_exc()
+
+
+def plot_one(plot):
+    '''Draw a deferred quantify.ParetoPlot, returning None, or the error if it fails.'''
+    try:
+        quantify.plot_all(*plot)
+    except Exception:
+        return traceback.format_exc()
+
+
+def analyze(args):
+    '''Analyze every saved tree, writing the report CSV and a _pareto.png per tree to the output folder.'''
+    paths = find_files(args.sources, args.pattern)
+    output_path = Path(args.output)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    failed = []
+    report_dest = quantify.report_dest(output_path)
+    # deferred plots are drawn by a process of their own, while the workers go on to the next trees
+    plotter = ProcessPoolExecutor(max_workers=1) if args.plots == 'deferred' else nullcontext()
+    with open(report_dest, 'a', encoding='utf-8', newline='') as csvfile, plotter:
+        w = csv.DictWriter(csvfile, fieldnames=quantify.REPORT_FIELDS)
+        w.writeheader()
+        pending = deque()
+
+        def wait_for_plot():
+            path, future = pending.popleft()
+            error = future.result()
+            if error is not None:
+                print(f"Failed to plot {path.name}\n{error}")
+
+        cache = None if args.cache is None else ResultCache(args.cache, max_bytes=args.cache_size * 2**20)
+        # trees take very different times to analyze, so they are handed out one at a time
+        work = partial(analyze_one, output_path=output_path, adaptive=args.adaptive, cache=cache, plots=args.plots)
+        for i, (path, (results, plot, error)) in enumerate(zip(paths, run_parallel(work, paths, args.workers, chunksize=1)), 1):
+            if error is None:
+                w.writerow(results)
+                print(f"Processed file {i}/{len(paths)}: {path.name}")
+            else:
+                failed.append(path)
+                print(f"Failed on file {i}/{len(paths)}: {path.name}\n{error}")
+
+            if plot is not None:
+                pending.append((path, plotter.submit(plot_one, plot)))
+                if len(pending) > MAX_PENDING_PLOTS:
+                    wait_for_plot()
+
+        while pending:
+            wait_for_plot()
+
+    print(f'Finished: {len(paths) - len(failed)}/{len(paths)} files analyzed; wrote report to {report_dest}')
+
+
+def analyze_plant(paths, adaptive=False, cache=None):
+    '''Run quantify.analyze_plant on one plant's days, returning (rows, None), or (None, error) if it fails.'''
+    try:
+        return list(quantify.analyze_plant(paths, adaptive=adaptive, cache=cache)), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def series(args):
+    '''Analyze saved trees as time series, one plant per worker, and write the growth report to the output folder.'''
+    plants = quantify.group_series(find_files(args.sources, args.pattern))
+    output_path = Path(args.output)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    failed = []
+    report_dest = quantify.report_dest(output_path, prefix='series')
+    with open(report_dest, 'a', encoding='utf-8', newline='') as csvfile:
+        w = csv.DictWriter(csvfile, fieldnames=quantify.SERIES_FIELDS)
+        w.writeheader()
+
+        cache = None if args.cache is None else ResultCache(args.cache, max_bytes=args.cache_size * 2**20)
+        # each plant's days depend on each other, so whole plants are handed out
+        work = partial(analyze_plant, adaptive=args.adaptive, cache=cache)
+        results = run_parallel(work, list(plants.values()), args.workers, chunksize=1)
+        for i, (plant, (rows, error)) in enumerate(zip(plants, results), 1):
+            if error is None:
+                w.writerows(rows)
+                print(f"Processed plant {i}/{len(plants)}: {plant} ({len(rows)} days)")
+            else:
+                failed.append(plant)
+                print(f"Failed on plant {i}/{len(plants)}: {plant}\n{error}")
+
+    print(f'Finished: {len(plants) - len(failed)}/{len(plants)} plants analyzed; wrote report to {report_dest}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Batch processing for Ariadne files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    # options every command takes
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: one per CPU)')
+
+    check = commands.add_parser('validate', parents=[common], help='check .xyz files for hierarchy errors')
+    check.add_argument('sources', nargs='+', help='directories and/or globs of .xyz files')
+    check.add_argument('--pattern', default='*.txt', help='files to pick up from directories (default: *.txt)')
+    check.add_argument('-o', '--output', default='graph_results.csv', help='report to write (default: graph_results.csv)')
+    check.set_defaults(run=validate)
+
+    measure = commands.add_parser('analyze', parents=[common], help='analyze saved trees (.json or .npy)')
+    measure.add_argument('sources', nargs='+', help='directories and/or globs of tree files')
+    measure.add_argument('--pattern', default='*.json', help='files to pick up from directories (default: *.json)')
+    measure.add_argument('-o', '--output', default='.', help='folder for the report and plots (default: current folder)')
+    measure.add_argument('--adaptive', action='store_true', help='sample the Pareto front adaptively (see pareto_functions.adaptive_front)')
+    measure.add_argument('--plots', choices=['inline', 'deferred', 'none'], default='inline',
+                         help='draw the Pareto plots in the analysis workers (inline), in a separate plotting process (deferred), or not at all (default: inline)')
+    measure.add_argument('--cache', metavar='DIR', help='reuse Pareto fronts and random trees of unchanged plants, cached in DIR')
+    measure.add_argument('--cache-size', type=int, default=512, metavar='MB', help='size limit of the cache (default: 512 MB)')
+    measure.set_defaults(run=analyze)
+
+    grow = commands.add_parser('series', parents=[common], help='analyze saved trees as time series, by plant and day')
+    grow.add_argument('sources', nargs='+', help='directories and/or globs of tree files named <source>_plant<ID>_day<N>')
+    grow.add_argument('--pattern', default='*.json', help='files to pick up from directories (default: *.json)')
+    grow.add_argument('-o', '--output', default='.', help='folder for the report (default: current folder)')
+    grow.add_argument('--adaptive', action='store_true', help='sample the Pareto front adaptively (see pareto_functions.adaptive_front)')
+    grow.add_argument('--cache', metavar='DIR', help='reuse Pareto fronts and random trees of unchanged plants, cached in DIR')
+    grow.add_argument('--cache-size', type=int, default=512, metavar='MB', help='size limit of the cache (default: 512 MB)')
+    grow.set_defaults(run=series)
+
+    args = parser.parse_args()
+    args.run(args)
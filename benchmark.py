@@ -0,0 +1,213 @@
+'''Benchmark how the Pareto functions scale, on synthetic root systems of increasing size.
+
+synthetic_root() grows a plant with a primary root, lateral roots and (optionally) higher-order
+laterals, with a given number of root tips. It returns the same kind of graph TracerUI saves:
+a DiGraph from parent to child whose nodes have "pos", "LR_index" and "root_deg", with node 0
+at [0,0]. Edges also carry their "weight", so the graph can go straight into the Pareto functions.
+
+Each benchmark is timed on its own, then run again under tracemalloc to get its peak memory.
+Results (one record per function and size, tagged with the current git commit) are written
+as JSON or CSV, so runs from different commits can be compared. Each record is written as soon
+as it is measured, and a benchmark that runs out of memory is recorded as such (with its error)
+rather than ending the run.
+
+Usage:
+python benchmark.py --sizes 10 100 1000 --output results.json
+'''
+
+import argparse
+import csv
+import json
+import math
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+
+from pareto_functions import (ParetoContext, graph_costs, pareto_front, pareto_steiner_array,
+                              pareto_steiner_fast, pareto_steiner_segments, random_tree)
+
+# default plant sizes, in root tips
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+# alpha used by the single-tree benchmarks
+ALPHA = 0.5
+
+# fields of each benchmark record, in CSV column order
+FIELDS = ['commit', 'function', 'tips', 'nodes', 'seconds', 'peak_mb', 'error']
+
+
+def synthetic_root(n_tips, order=2, seed=None, step=20):
+    '''
+    Grow a synthetic root system with n_tips root tips (n_tips >= 1).
+
+    The primary root grows downwards. Lateral roots branch off it on alternating sides and
+    bend back towards gravity as they grow. If order > 1, the laterals carry laterals of their own,
+    up to `order` degrees. Tips are shared out as evenly as the branching allows, and each root
+    is made of segments about `step` px long, with one segment per branch point (plus a few more).
+    '''
+    assert n_tips >= 1 and order >= 1
+    rng = np.random.default_rng(seed)
+
+    DG = nx.DiGraph()
+    DG.add_node(0, pos=[0, 0], LR_index=None, root_deg=0)
+    num_LRs = 0
+
+    # roots still to be grown: (branch point, heading in radians, tips, root degree)
+    # a heading of 0 points straight down (y increases downwards, as on the canvas)
+    pending = [(0, 0.0, n_tips, 0)]
+    while pending:
+        start, heading, tips, degree = pending.pop()
+        if degree == 0:
+            LR_index = None
+        else:
+            LR_index = num_LRs
+            num_LRs += 1
+
+        # split the tips left over (after this root's own) between its laterals
+        if degree == order or tips == 1:
+            shares = []
+        elif degree == order - 1:
+            shares = [1] * (tips - 1)
+        else:
+            nlaterals = max(1, round((tips - 1) ** (1 / (order - degree))))
+            shares = [len(part) for part in np.array_split(np.arange(tips - 1), nlaterals)]
+
+        # laterals emerge from every other node, past the first couple of segments
+        nsegments = 2 * len(shares) + 3
+        x, y = DG.nodes[start]['pos']
+        prev = start
+        side = 1
+        for i in range(nsegments):
+            # laterals curve down, while the primary root wanders a little around vertical
+            if degree == 0:
+                heading = 0.9 * heading + rng.normal(0, 0.05)
+            else:
+                heading *= 0.97
+            length = step * rng.uniform(0.75, 1.25)
+            x += length * math.sin(heading)
+            y += length * math.cos(heading)
+
+            node = DG.number_of_nodes()
+            DG.add_node(node, pos=[int(round(x)), int(round(y))], LR_index=LR_index, root_deg=degree)
+            DG.add_edge(prev, node)
+            prev = node
+
+            j = i - 2
+            if j >= 0 and j % 2 == 0 and j // 2 < len(shares):
+                angle = side * rng.uniform(math.pi / 4, math.pi / 2.5)
+                pending.append((node, heading + angle, shares[j // 2], degree + 1))
+                side = -side
+
+    for u, v in DG.edges:
+        (x1, y1), (x2, y2) = DG.nodes[u]['pos'], DG.nodes[v]['pos']
+        DG.edges[u, v]['weight'] = math.hypot(x2 - x1, y2 - y1)
+
+    return DG
+
+
+def git_commit():
+    '''Return the current commit hash, or None outside of a git checkout.'''
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+# name : (function of a plant and its ParetoContext, largest plant it's run on by default)
+# (at the default limits, no benchmark needs more than about 1 GB: random_tree on 100000 tips peaks at 0.9 GB)
+BENCHMARKS = {
+    'graph_costs' : (lambda G, ctx: graph_costs(G, critical_nodes=set(ctx.critical_nodes.tolist())), 100000),
+    'random_tree' : (lambda G, ctx: random_tree(G, ctx=ctx, seed=0), 100000),
+    'pareto_steiner_fast' : (lambda G, ctx: pareto_steiner_fast(G, ALPHA, ctx=ctx), 2000),
+    'pareto_steiner_array' : (lambda G, ctx: pareto_steiner_array(G, ALPHA, ctx=ctx), 2000),
+    'pareto_steiner_segments' : (lambda G, ctx: pareto_steiner_segments(G, ALPHA, ctx=ctx), 10000),
+    'pareto_front' : (lambda G, ctx: pareto_front(G, ctx=ctx), 200),
+    'pareto_front (segments)' : (lambda G, ctx: pareto_front(G, engine='segments', ctx=ctx), 1000),
+}
+
+
+def measure(func, G):
+    '''Run func on G twice: once for wall time, and once under tracemalloc for peak memory.'''
+    # the context is built fresh (and untimed) each time, so no run benefits from the last one's cache
+    ctx = ParetoContext(G)
+    start = time.perf_counter()
+    func(G, ctx)
+    seconds = time.perf_counter() - start
+
+    ctx = ParetoContext(G)
+    tracemalloc.start()
+    try:
+        func(G, ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return seconds, peak / 2**20
+
+
+def run(sizes, names, order=2, seed=0, max_tips=None):
+    '''Run every named benchmark on a synthetic plant of each size, yielding each record as soon as it's measured.'''
+    commit = git_commit()
+    for tips in sizes:
+        G = synthetic_root(tips, order=order, seed=seed)
+        for name in names:
+            func, limit = BENCHMARKS[name]
+            if tips > (max_tips or limit):
+                continue
+            record = dict(commit=commit, function=name, tips=tips, nodes=G.number_of_nodes(),
+                          seconds=None, peak_mb=None, error=None)
+            try:
+                record['seconds'], record['peak_mb'] = measure(func, G)
+            except MemoryError as e:
+                # too big for this machine; record it and go on with the rest
+                record['error'] = f'{type(e).__name__}: {e}'
+                print(f"{name:>24} {tips:>7} tips: out of memory", flush=True)
+            else:
+                print(f"{name:>24} {tips:>7} tips: {record['seconds']:10.4f} s {record['peak_mb']:10.1f} MB", flush=True)
+            yield record
+
+
+def write_results(records, dest):
+    '''
+    Write the benchmark records to dest as they come in, as CSV if it ends in .csv and as JSON
+    otherwise, so whatever was measured is kept if the run is cut short. Returns the number written.
+    '''
+    dest = Path(dest)
+    written = []
+    if dest.suffix == '.csv':
+        with open(dest, 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=FIELDS)
+            w.writeheader()
+            for record in records:
+                w.writerow(record)
+                f.flush()
+                written.append(record)
+    else:
+        for record in records:
+            written.append(record)
+            # rewrite the whole (small) file each time, so it's always valid JSON
+            with open(dest, 'w') as f:
+                json.dump(written, f, indent=1)
+    return len(written)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the Pareto functions on synthetic root systems.')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='plant sizes, in root tips')
+    parser.add_argument('-f', '--functions', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS), metavar='NAME',
+                        help=f"functions to benchmark (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--order', type=int, default=2, help='highest lateral root degree (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic plants')
+    parser.add_argument('--max-tips', type=int, help="run every function up to this size, overriding each one's default limit")
+    parser.add_argument('-o', '--output', default='benchmark.json', help='results file, .json or .csv (default: benchmark.json)')
+    args = parser.parse_args()
+
+    records = run(args.sizes, args.functions, order=args.order, seed=args.seed, max_tips=args.max_tips)
+    count = write_results(records, args.output)
+    print(f'wrote {count} results to {args.output}')
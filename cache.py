@@ -0,0 +1,126 @@
+'''On-disk cache for the expensive part of the analysis: the Pareto front and the random trees.
+
+Entries are keyed by a hash of everything those results depend on. The front and the random
+trees only depend on the positions of the critical nodes (the root and the root tips), which
+are hashed in sorted order, so neither the node numbering nor the save format matters. The
+actual wiring cost and conduction delay sum up the rest of the tree; both are exact sums
+(math.fsum), so a tree gives the same costs whether it was loaded from .json or .npy. The key
+also covers the alpha grid and the parameters of the calculation. A tree that hasn't changed
+since the last run is therefore found again under any file name, in either format, while any
+edit to it misses the cache.
+
+Each entry is a pickle file in the cache folder, written atomically, so several processes
+(e.g. batch.py analyze workers) can share one cache. Reading an entry marks it as recently
+used. Once the folder grows past max_bytes, the least recently used entries are deleted.
+'''
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from pareto_functions import DEFAULT_ALPHAS
+
+# bump this whenever a change to the Pareto functions changes their results
+CACHE_VERSION = 2
+
+
+def pareto_key(ctx, actual, **params):
+    '''
+    Hash of a plant's ParetoContext, its actual (wiring cost, conduction delay) and the
+    parameters of the calculation (any keyword arguments), as a hex string.
+    '''
+    h = hashlib.sha256()
+    h.update(f'ariadne-pareto-v{CACHE_VERSION}'.encode())
+    coords = np.asarray(ctx.coords, dtype='<f8')
+    h.update(coords[ctx.root].tobytes())
+    h.update(np.ascontiguousarray(coords[np.lexsort(coords.T[::-1])]).tobytes())
+    h.update(np.asarray(actual, dtype='<f8').tobytes())
+    h.update(np.ascontiguousarray(DEFAULT_ALPHAS, dtype='<f8').tobytes())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    '''
+    Folder of cached results, at most max_bytes in total (LRU eviction)
+    '''
+    def __init__(self, path, max_bytes=512 * 2**20):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def entry(self, key):
+        return self.path / f'{key}.pkl'
+
+    def get(self, key):
+        '''Return the value stored under key, or None if there isn't one.'''
+        entry = self.entry(key)
+        try:
+            with open(entry, 'rb') as f:
+                value = pickle.load(f)
+            # mark as recently used
+            os.utime(entry)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # not cached, or evicted (or half-written by a process that died) since
+            return None
+        return value
+
+    def put(self, key, value):
+        '''Store value under key, then evict old entries if the cache is over its size limit.'''
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.entry(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        '''Delete the least recently used entries until the cache fits in max_bytes.'''
+        entries = []
+        total = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # another process evicted it first
+                pass
+            total -= size
+
+    def clear(self):
+        '''Delete every entry.'''
+        for entry in self.path.glob('*.pkl'):
+            entry.unlink()
+
+
+class LastResult:
+    '''
+    In-memory stand-in for a ResultCache that only holds the last entry put in it: enough for
+    the days of a time series, where a plant that hasn't grown since the day before has the same key
+    '''
+    def __init__(self):
+        self.key = None
+        self.value = None
+
+    def get(self, key):
+        '''Return the value stored under key, or None if it wasn't the last one stored.'''
+        return self.value if key == self.key else None
+
+    def put(self, key, value):
+        self.key = key
+        self.value = value
@@ -28,14 +28,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from pathlib import Path
-from queue import Queue
 from collections import deque
-import copy
-from datetime import datetime
 import csv
 
-# TODO: TEST HISTORY DEQUE ACCURACY
-
 
 class StartupUI:
     '''Startup window interface.'''
@@ -109,6 +104,8 @@ class TracerUI(tk.Frame):
         self.button_override = tk.Button(self.menu, text='Override (r)', command=None, state='disabled')
         self.button_insert = tk.Button(self.menu, text='Insert (i)', command=None, state='disabled')
         self.button_undo = tk.Button(self.menu, text='Undo (Ctrl-z)', command=None, state='disabled')
+        self.button_redo = tk.Button(self.menu, text='Redo (Ctrl-y)', command=None, state='disabled')
+        self.button_delete = tk.Button(self.menu, text='Delete (d)', command=None, state='disabled')
         self.button_save = tk.Button(self.menu, text='Save (g)', command=None, state='disabled')
         self.button_show = tk.Button(self.menu, text='Show/hide tree (t)', command=None, state='disabled')
 
@@ -118,6 +115,8 @@ class TracerUI(tk.Frame):
         self.button_override.pack(fill='x', side='top')
         self.button_insert.pack(fill='x', side='top')
         self.button_undo.pack(fill='x', side='top')
+        self.button_redo.pack(fill='x', side='top')
+        self.button_delete.pack(fill='x', side='top')
         self.button_save.pack(fill='x', side='top')
         self.button_show.pack(fill='x', side='top')
 
@@ -128,7 +127,6 @@ class TracerUI(tk.Frame):
         # useful flags
         self.prox_override = False # tracks whether proximity override is on
         self.inserting = False # tracks whether insertion mode is on
-        self.tree_flag = 'normal' # used for hiding/showing tree's edges
         self.colors = 0 # tracks LR color palette index
 
         # canvas scrollbars
@@ -184,9 +182,8 @@ class TracerUI(tk.Frame):
 
     def click_info(self, event):
         '''Show node metadata on right click (for debugging).'''
-        for n in self.tree.nodes:  # check click proximity to existing points
-            if ((abs(n.coords[0]-event.x)) < 10) and ((abs(n.coords[1]-event.y)) < 10):
-                self.canvas.create_text(event.x, event.y, anchor="nw", text=f"d{n.depth}/lri{n.LR_index}/deg{n.root_degree}", fill="white")
+        for n in self.tree.near(event.x, event.y):  # check click proximity to existing points
+            self.canvas.create_text(event.x, event.y, anchor="nw", text=f"d{n.depth}/lri{n.LR_index}/deg{n.root_degree}", fill="white")
 
     def scroll_start(self, event):
         '''Mouse panning start.'''
@@ -221,8 +218,7 @@ class TracerUI(tk.Frame):
 
         # current tree
         self.tree = Tree(self.path) # instantiate first tree ## think about clearing/overwriting
-
-        self.history = deque(maxlen=6) # gets updated on every add_node()
+        self.render = Renderer(self.canvas)
 
         # enable buttons and add relevant keybinds
         self.canvas.bind("<Button 1>", self.place_node)
@@ -239,6 +235,12 @@ class TracerUI(tk.Frame):
         self.button_undo.config(command=self.undo, state='normal')
         self.canvas.bind('<Control-z>', self.undo)
 
+        self.button_redo.config(command=self.redo, state='normal')
+        self.canvas.bind('<Control-y>', self.redo)
+
+        self.button_delete.config(command=self.delete, state='normal')
+        self.canvas.bind('d', self.delete)
+
         self.button_override.config(command=self.override, state='normal')
         self.canvas.bind('r', self.override)
 
@@ -289,49 +291,34 @@ class TracerUI(tk.Frame):
 
         # check click proximity to existing nodes
         if not self.prox_override:
-            for n in self.tree.nodes:
-                if ((abs(n.coords[0]-x)) < 10) and ((abs(n.coords[1]-y)) < 10):
-                    if not n.is_selected:  # select a nearby unselected point
-                        for m in self.tree.nodes:
-                            m.deselect()
-                        n.select()
-                    self.color_nodes()
-                    return
+            for n in self.tree.near(x, y): # the nearest one
+                if not n.is_selected:  # select a nearby unselected point
+                    self.select(n)
+                return
+
+        # new nodes need a parent, once the tree has been started
+        if self.tree.nodes and not self.tree.selected:
+            print("Please select the node you'd like to add to.")
+            return
 
         # if inserting, check that root_choice exists (if needed)
         if self.inserting:
-            for n in self.tree.nodes:
-                if n.is_selected:
-                    if len(n.children) > 1:
-                        if self.tree.root_choice is None:
-                            print("Please use the right arrow key to choose which root you'd like to insert on.")
-                            return
+            for n in self.tree.selected:
+                if len(n.children) > 1:
+                    if self.tree.root_choice is None:
+                        print("Please use the right arrow key to choose which root you'd like to insert on.")
+                        return
 
         # place a new point and select it
-        idx = self.canvas.create_oval(x, y, x+2, y+2, width=2, fill="red", outline="red")
-        point = Node((x, y), idx, self.canvas, self.tree)
-
-        hologram, draw = self.tree.add_node(point, self.inserting)
-        self.history.append(hologram) # save tree as it was just before new node was added
+        point = Node((x, y), None, self.canvas, self.tree)
 
-        self.tree.index_LRs()
+        op = self.tree.add_node(point, self.inserting)
+        self.sync(op) # draw the new node and its edges
 
         if self.inserting:
-            self.redraw() # update edges following add_node() above
-            for n in self.tree.nodes:  # deselect all other points
-                n.deselect()
             self.insert()  # turn off insertion mode after placing new point
-        else:
-            for n in self.tree.nodes:
-                if n.is_selected:
-                    self.draw_edge(n, point)
-                n.deselect()
-
-        if draw is not None:
-            self.draw_edge(draw[0], draw[1])
 
-        point.select()
-        self.color_nodes()
+        self.select(point) # deselect all other points
 
         # turn off override mode after placing new point
         if self.prox_override:
@@ -366,22 +353,14 @@ class TracerUI(tk.Frame):
                 self.override()
 
             # remove any leftover highlights
-            to_clear = set()
-            for m in self.tree.nodes:
-                if m.is_highlighted:
-                    to_clear.add(m)
-            self.highlight_nodes(to_clear)
+            self.highlight_nodes(set(self.tree.highlighted))
 
         else:
-            selected_count = 0
-            for n in self.tree.nodes:
-                if n.is_selected:
-                    if len(n.children) == 0:
-                        print("Warning: can't insert at terminal point")
-                        return
-                    else:
-                        selected_count += 1
-            if selected_count > 1:
+            for n in self.tree.selected:
+                if len(n.children) == 0:
+                    print("Warning: can't insert at terminal point")
+                    return
+            if len(self.tree.selected) > 1:
                 print("Warning: can't insert with >1 point selected")
                 return
 
@@ -394,8 +373,8 @@ class TracerUI(tk.Frame):
             if not self.prox_override:
                 self.override()
 
-    def draw_edge(self, parent, child):
-        '''Draw an edge between 2 nodes, and add it to the tree.'''
+    def color_edge(self, parent, child):
+        '''Pick the color of the edge between 2 nodes (drawn by the renderer).'''
         # TODO: test that checks if drawn edge matches the data/hierarchy
         if child.root_degree == 0: # PR
             color = 'green'
@@ -407,9 +386,6 @@ class TracerUI(tk.Frame):
         else: # LR
             color = parent.pedge_color
 
-        edge = self.canvas.create_line(parent.coords[0], parent.coords[1], child.coords[0], child.coords[1], fill=color, state=f'{self.tree_flag}')
-        self.tree.edges.append(edge)
-        child.pedge = edge
         child.pedge_color = color
 
     def get_color(self):
@@ -436,64 +412,63 @@ class TracerUI(tk.Frame):
 
     def undo(self, event=None):
         '''Undo the last graph-altering action.'''
-        ## comment this better
         try:
-            previous = self.history.pop()
-            for n in self.tree.nodes:
-                self.canvas.delete(n.shape_val)
-            for e in self.tree.edges:
-                self.canvas.delete(e)
-            self.tree.edges = []
-
-            self.tree = previous
-
-            for n in self.tree.nodes:
-                x = n.coords[0]
-                y = n.coords[1]
-                if not n.is_selected:
-                    n.shape_val = self.canvas.create_oval(x,y,x+2,y+2,width=1,fill="white", outline='white')
-                else:
-                    n.shape_val = self.canvas.create_oval(x,y,x+2,y+2,width=2,fill="red", outline="red")
-
-            self.redraw()
+            op = self.tree.undo()
+        except IndexError: # start of history
+            print('Nothing to undo')
+            return
 
-        except IndexError as e: # end of history deque
-            print(e)
-            pass
+        self.sync(op)
+        self.select(op.selection[0])
 
-    def redraw(self):
-        '''Redraw the current tree's edges.'''
-        # 1) delete existing tree's edges
-        for e in self.tree.edges:
-            self.canvas.delete(e)
-        self.tree.edges = []
+    def redo(self, event=None):
+        '''Redo the last undone action.'''
+        try:
+            op = self.tree.redo()
+        except IndexError: # end of history
+            print('Nothing to redo')
+            return
 
-        # 2) redraw it based on new nodes
-        for n in self.tree.nodes:
-            for m in n.children:
-                x = self.canvas.create_line(m.coords[0], m.coords[1], n.coords[0], n.coords[1], fill=m.pedge_color, state=f'{self.tree_flag}')
-                self.tree.edges.append(x)
+        self.sync(op)
+        self.select(op.selection[1])
+
+    def delete(self, event=None):
+        '''Delete the selected node(s), moving their children up to their parents.'''
+        for n in list(self.tree.selected):
+            if n.parent is None and n.children:
+                print("Warning: can't delete the top node while the rest of the tree is there")
+                continue
+            op = self.tree.delete_node(n)
+            self.sync(op)
+            n.deselect()
+        self.color_nodes(self.tree.selected)
+
+    def select(self, node):
+        '''Select a single node (or none), and refresh the colors of the nodes that changed.'''
+        changed = self.tree.deselect_all()
+        if node is not None and node.in_tree:
+            node.select()
+            changed.add(node)
+        self.color_nodes(changed)
+
+    def sync(self, op):
+        '''Bring the canvas up to date after an operation, by redrawing only the nodes it touched (and their parent edges).'''
+        for n in op.touched:
+            if n.in_tree and n.parent is not None:
+                self.color_edge(n.parent, n)
+        self.render.mark(op.touched)
+        self.render.flush()
 
     def show_tree(self, event=None):
         '''Toggle visibility of tree edges.'''
-        if self.tree.is_shown is False:
-            self.tree_flag = 'normal'
-            self.tree.is_shown = True
-        else:
-            self.tree_flag = 'hidden'
-            self.tree.is_shown = False
+        self.tree.is_shown = not self.tree.is_shown
+        self.render.show_edges(self.tree.is_shown)
 
-        for e in self.tree.edges:
-            self.canvas.itemconfig(e, state=f'{self.tree_flag}')
 
-
-    def color_nodes(self):
-        '''Refresh node colors to reflect whether they are selected/deselected.'''
-        for n in self.tree.nodes:
-            if n.is_selected:
-                self.canvas.itemconfig(n.shape_val, fill="red", outline="red", width=2)
-            else:
-                self.canvas.itemconfig(n.shape_val, fill="white", outline="white", width=1)
+    def color_nodes(self, nodes=None):
+        '''Refresh node colors to reflect whether they are selected/deselected (for the given nodes, or all of them).'''
+        self.render.mark(self.tree.nodes if nodes is None else nodes)
+        self.render.flush()
 
 
     def find_root(self, n, excluded):
@@ -522,35 +497,31 @@ class TracerUI(tk.Frame):
         '''Highlight/unhighlight a set of nodes.'''
         for i in targets:
             if not i.is_highlighted:
-                self.canvas.itemconfig(i.shape_val, fill='yellow', outline='yellow', width='2')
                 i.is_highlighted = True
+                self.tree.highlighted.add(i)
             else: # un-highlight
-                self.canvas.itemconfig(i.shape_val, fill='white', outline='white', width='1')
                 i.is_highlighted = False
+                self.tree.highlighted.discard(i)
+        self.color_nodes(targets)
 
 
     def cycle_highlights(self, event=None):
         '''Cycle thru children of a branch point (for insertion mode).'''
         if self.inserting:
-            for n in self.tree.nodes:
-                if n.is_selected:
-                    # first, clear all current highlights
-                    to_clear = set()
-                    for m in self.tree.nodes:
-                        if m.is_highlighted:
-                            to_clear.add(m)
-                    self.highlight_nodes(to_clear)
-
-                    # now, highlight the current highlight_choice
-                    pos = (self.highlight_choice - len(n.children)) % len(n.children)
-                    self.tree.root_choice = n.children[pos] # save the current choice
-
-                    to_show = set()
-                    to_show.add(self.tree.root_choice)
-                    self.highlight_nodes(to_show)
-
-                    # get ready for next call
-                    self.highlight_choice += 1
+            for n in self.tree.selected:
+                # first, clear all current highlights
+                self.highlight_nodes(set(self.tree.highlighted))
+
+                # now, highlight the current highlight_choice
+                pos = (self.highlight_choice - len(n.children)) % len(n.children)
+                self.tree.root_choice = n.children[pos] # save the current choice
+
+                to_show = set()
+                to_show.add(self.tree.root_choice)
+                self.highlight_nodes(to_show)
+
+                # get ready for next call
+                self.highlight_choice += 1
         else:
             self.base.bell()
 
@@ -558,9 +529,8 @@ class TracerUI(tk.Frame):
 
     def EG_highlight_root(self, event=None):
         # if the node belongs to >1 root, skip
-        for point in self.tree.nodes:
-            if point.is_selected:
-                n = point
+        for point in self.tree.selected:
+            n = point
 
         if len(n.children) > 1:
             return
@@ -588,7 +558,7 @@ class TracerUI(tk.Frame):
             if self.tree.plant is None: # user didn't update ID (pressed cancel)
                 return
 
-        self.tree.index_LRs()
+        self.tree.check_LRs()
 
         # sort all nodes by depth
         # ordered_tree = sorted(self.nodes, key=lambda node: node.depth)
@@ -604,11 +574,16 @@ class TracerUI(tk.Frame):
         # convert Tree to NX graph
         DG = nx.DiGraph()
 
+        # deleting nodes can leave gaps in the LR indices, so number the remaining LRs 0, 1, 2... in the same order
+        LR_indices = sorted({node.LR_index for node in self.tree.nodes if node.LR_index is not None})
+        renumber = {old: new for new, old in enumerate(LR_indices)}
+        renumber[None] = None
+
         # make ebunches (2-tuples of adjacent nodes)
         ebunches = []
         for node in self.tree.nodes:
             # add nodes w/ positions and LR indices
-            DG.add_node(node.relcoords, pos=node.relcoords, LR_index=node.LR_index, root_deg=node.root_degree)
+            DG.add_node(node.relcoords, pos=node.relcoords, LR_index=renumber[node.LR_index], root_deg=node.root_degree)
 
             for child in node.children:
                 ebunches.append((node.relcoords, child.relcoords))
@@ -622,6 +597,89 @@ class TracerUI(tk.Frame):
             json.dump(s, h)
             print(f'wrote to output {output_name}')
 
+        # binary copy of the same tree, which the analyzer can read without building a graph
+        quantify.save_tree(DG, output_path.with_suffix('.npy'))
+
+
+class Renderer:
+    '''
+    Draws a tree's nodes and edges on a canvas, only issuing Tk calls for what has changed.
+
+    Nodes whose selection, highlighting, parent or edge color may have changed are marked dirty;
+    flush() then compares each of them to what was last drawn for it, and creates, moves, recolors
+    or deletes its oval and parent edge only as needed. Every edge carries the 'edge' tag, so
+    showing/hiding them all takes a single call.
+    '''
+    NODE_STYLES = {
+        'normal': dict(fill='white', outline='white', width=1),
+        'selected': dict(fill='red', outline='red', width=2),
+        'highlighted': dict(fill='yellow', outline='yellow', width=2),
+    }
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.dirty = set() # nodes to check at the next flush
+        self.drawn = {} # node: (style, edge) as last drawn, where edge is (coords, color) or None
+        self.edge_state = 'normal' # or 'hidden'
+
+    def mark(self, nodes):
+        '''Mark nodes to be redrawn at the next flush.'''
+        self.dirty.update(nodes)
+
+    def flush(self):
+        '''Bring the canvas up to date with the dirty nodes.'''
+        for n in self.dirty:
+            self.draw(n)
+        self.dirty.clear()
+
+    def show_edges(self, shown):
+        '''Show or hide every edge, including ones drawn later.'''
+        self.edge_state = 'normal' if shown else 'hidden'
+        self.canvas.itemconfigure('edge', state=self.edge_state)
+
+    def draw(self, n):
+        '''Update a node's oval and parent edge, if they differ from what was last drawn.'''
+        style, edge = self.drawn.pop(n, (None, None))
+
+        if not n.in_tree: # deleted
+            if n.shape_val is not None:
+                self.canvas.delete(n.shape_val)
+                n.shape_val = None
+            if n.pedge is not None:
+                self.canvas.delete(n.pedge)
+                n.pedge = None
+            return
+
+        if n.is_highlighted:
+            new_style = 'highlighted'
+        elif n.is_selected:
+            new_style = 'selected'
+        else:
+            new_style = 'normal'
+
+        if n.shape_val is None:
+            x, y = n.coords
+            n.shape_val = self.canvas.create_oval(x, y, x+2, y+2, **self.NODE_STYLES[new_style])
+        elif new_style != style:
+            self.canvas.itemconfig(n.shape_val, **self.NODE_STYLES[new_style])
+
+        new_edge = None if n.parent is None else (n.parent.coords + n.coords, n.pedge_color)
+        if new_edge is None:
+            if n.pedge is not None:
+                self.canvas.delete(n.pedge)
+                n.pedge = None
+        elif n.pedge is None:
+            coords, color = new_edge
+            n.pedge = self.canvas.create_line(*coords, fill=color, tags='edge', state=self.edge_state)
+        elif new_edge != edge:
+            coords, color = new_edge
+            if edge is None or coords != edge[0]:
+                self.canvas.coords(n.pedge, *coords)
+            if edge is None or color != edge[1]:
+                self.canvas.itemconfig(n.pedge, fill=color)
+
+        self.drawn[n] = (new_style, new_edge)
+
 
 class Node:
     '''An (x,y,0) point along a root.'''
@@ -630,10 +688,12 @@ class Node:
         self.coords = coords  # (x,y) tuple
         self.relcoords = None  # (x,y) relative to root node
         self.shape_val = shape_val  # canvas object ID
+        self.tree = tree
         self.is_selected = False
-        self.is_visited = False # for DFS; remember to clear it!
         self.depth = None # depth of node in the tree, relative to root
+        self.parent = None
         self.children = []
+        self.in_tree = False # False until added, and again once deleted (the node is kept for undo/redo)
         self.LR_index = None  # each distinct LR has a unique index
         self.root_degree = None # 0 = PR, 1 = primary LR, 2 = secondary LR, None = not yet determined
         self.is_highlighted = False
@@ -643,16 +703,19 @@ class Node:
 
     def select(self):
         self.is_selected = True
+        self.tree.selected.add(self)
 
     def deselect(self):
         self.is_selected = False
+        self.tree.selected.discard(self)
 
 
 class Tree:
     '''An acyclic, undirected, connected, hierarchical collection of nodes.'''
+    HIT_RADIUS = 10 # px; a click within this distance of a node (on both axes) selects it
+
     def __init__(self, path):
         self.nodes = []
-        self.edges = []
         self.plant = None  # ID of plant on plate (e.g. A-E, from left to right)
         self.is_shown = True # toggle display of edges
         self.top = None  # keep track of root node at top of tree
@@ -660,115 +723,168 @@ class Tree:
         self.num_LRs = 0 # use for indexing
         self.root_choice = None # which node to use as child when inserting
 
+        # nodes that are selected/highlighted, so nothing has to scan the whole tree for them
+        self.selected = set()
+        self.highlighted = set()
+
+        # spatial index for hit-testing clicks: node canvas coords, bucketed into square cells of HIT_RADIUS px
+        self.grid = {}
+
+        # operations done and undone, for undo/redo (each holds a few references, so no limit is needed)
+        self.history = []
+        self.undone = []
+
     def add_node(self, obj, inserting):
-        '''Add a node to the tree.'''
-        hologram = copy.deepcopy(self) # save tree each time a node is to be added
-
-        if self.nodes: # non-empty
-            for n in self.nodes:
-                if n.is_selected:
-                    obj.depth = n.depth + 1  # child is one level lower
-                    obj.relcoords = ((obj.coords[0]-(self.nodes[0].coords[0])), (obj.coords[1]-(self.nodes[0].coords[1])))
-
-                    if inserting is True:
-                        self.insert_child(n, obj)
-                        draw = (n, obj) # call draw_edge once back at the UI level in place_node()
-                    else:
-                        self.add_child(n, obj)
-                        draw = None
-
-        else:  # if no nodes yet assigned
-            obj.depth = 0
+        '''Add a node to the tree, as a child of the selected node. Returns the operation, for undo/redo.'''
+        parent = None
+        for n in self.selected:
+            parent = n
+
+        if parent is None:  # if no nodes yet assigned
             obj.relcoords = (0, 0)
-            self.top = obj
-            obj.root_degree = 0
-            draw = None
-
-        # finally, add to tree (avoid self-assignment)
-        self.nodes.append(obj)
-
-        return hologram, draw
-
-##########################
-    def insert_child(self, curr, new):
-        '''Assign child when using insertion mode.'''
-        if len(curr.children) == 1: # easy case
-            new.children.append(curr.children[0])
-            del curr.children[0]
-            curr.children.append(new)
-
-            # if curr.root_degree == 0:
-            #     new.root_degree = 0
-            new.root_degree = curr.root_degree
-            new.LR_index = curr.LR_index
-            new.pedge_color = curr.pedge_color
-
-        else: # use root_choice
-            new.children.append(self.root_choice)
-            curr.children.remove(self.root_choice)
-            curr.children.append(new)
-
-            # if self.root_choice.root_degree == 0:
-            #     new.root_degree = 0
-
-            # if self.root_choice.LR_index is not None:
-            #     new.LR_index = self.root_choice.LR_index
-
-            new.root_degree = self.root_choice.root_degree
-            new.LR_index = self.root_choice.LR_index
-            new.pedge_color = self.root_choice.pedge_color
-
-        new.children[0].depth += 1
-        self.DFS(new.children[0])
-
-
-##########################
-
-    def add_child(self, curr, new):
-        '''Assign child in all other cases.'''
-        if len(curr.children) == 0:
-            if curr.root_degree == 0:
-                new.root_degree = 0
-
-        curr.children.append(new)
-
-    def DFS(self, root):
-        '''Walk tree depth-first and increment subtree depths +1. For insertion mode.'''
-        root.is_visited = True
-        for child in root.children:
-            if child is not None and child.is_visited is False:
-                child.depth += 1
-                child.is_visited = True
-                self.DFS(child)
-
-        # reset is_visited flags when done!
-        for node in self.nodes:
-            node.is_visited = False
-
-    def index_LRs(self):
-        '''Walk tree breadth-first and assign indices to lateral roots.'''
-        # assumption 1: time-series data, indexed often (so primary LRs will always get indexed before secondary LRs)
-        # assumption 2: no LRs of higher degree than secondary
-        q = Queue()
-        q.put(self.top)
-
-        while not q.empty():
-            curr = q.get()
-            # arbitrarily, we assign LR indices left-to-right
-            # sort by x-coordinate
-            curr_children = sorted(curr.children, key=lambda x: x.relcoords[0])
-
-            for n in curr_children:
-                if n.root_degree is None: # only index nodes that haven't been already
-                    if len(curr_children) == 1: # then n is part of the same root as curr
-                        n.root_degree = curr.root_degree
-                        if curr.LR_index is not None:
-                            n.LR_index = curr.LR_index
-                    else: # curr is a branch point (aka LR found)
-                        n.root_degree = curr.root_degree + 1
-                        n.LR_index = self.num_LRs
-                        self.num_LRs += 1
-                q.put(n)
+            op = AddChild(None, obj)
+        else:
+            obj.relcoords = ((obj.coords[0]-(self.nodes[0].coords[0])), (obj.coords[1]-(self.nodes[0].coords[1])))
+            if inserting is True:
+                if len(parent.children) == 1: # easy case
+                    op = InsertBetween(parent, obj, parent.children[0])
+                else: # use root_choice
+                    op = InsertBetween(parent, obj, self.root_choice)
+            else:
+                op = AddChild(parent, obj)
+
+        self.do(op)
+        return op
+
+    def delete_node(self, node):
+        '''Delete a node from the tree, splicing its children onto its parent. Returns the operation, for undo/redo.'''
+        op = DeleteNode(node)
+        self.do(op)
+        return op
+
+    def cell(self, x, y):
+        '''Return the grid cell of a canvas position.'''
+        return (int(x // self.HIT_RADIUS), int(y // self.HIT_RADIUS))
+
+    def grid_add(self, node):
+        '''Add a node to the grid (when it joins the tree).'''
+        self.grid.setdefault(self.cell(*node.coords), []).append(node)
+
+    def grid_remove(self, node):
+        '''Remove a node from the grid (when it leaves the tree).'''
+        cell = self.cell(*node.coords)
+        self.grid[cell].remove(node)
+        if not self.grid[cell]:
+            del self.grid[cell]
+
+    def near(self, x, y):
+        '''Return the nodes within HIT_RADIUS px of (x,y) on both axes, nearest first.'''
+        # any such node is in the cell of (x,y) or one of the 8 around it
+        cx, cy = self.cell(x, y)
+        found = []
+        for i in (cx-1, cx, cx+1):
+            for j in (cy-1, cy, cy+1):
+                for n in self.grid.get((i, j), ()):
+                    if ((abs(n.coords[0]-x)) < self.HIT_RADIUS) and ((abs(n.coords[1]-y)) < self.HIT_RADIUS):
+                        found.append(n)
+        return sorted(found, key=lambda n: (n.coords[0]-x)**2 + (n.coords[1]-y)**2)
+
+    def deselect_all(self):
+        '''Deselect every selected node, and return them.'''
+        selected = set(self.selected)
+        for n in selected:
+            n.deselect()
+        return selected
+
+    def do(self, op):
+        '''Apply an operation and add it to the undo history (which starts a new redo history).'''
+        op.do(self)
+        self.history.append(op)
+        self.undone.clear()
+
+    def undo(self):
+        '''Revert the last operation and return it (IndexError if there's nothing to undo).'''
+        op = self.history.pop()
+        op.undo(self)
+        self.undone.append(op)
+        return op
+
+    def redo(self):
+        '''Reapply the last undone operation and return it (IndexError if there's nothing to redo).'''
+        op = self.undone.pop()
+        op.do(self)
+        self.history.append(op)
+        return op
+
+    def shift_depths(self, root, delta):
+        '''Add delta to the depths of root and all the nodes below it. For insertion and deletion.'''
+        # walk the subtree depth-first with a stack, visiting each node once
+        stack = [root]
+        while stack:
+            n = stack.pop()
+            n.depth += delta
+            stack.extend(n.children)
+
+    def shift_degrees(self, root, delta):
+        '''Add delta to the root degrees of root and all the nodes below it. For deletion.'''
+        stack = [root]
+        while stack:
+            n = stack.pop()
+            n.root_degree += delta
+            stack.extend(n.children)
+
+    def index_node(self, n):
+        '''Assign a root degree and LR index to a node that doesn't have them yet, from its parent.'''
+        curr = n.parent
+        if n.root_degree is not None or curr is None: # only index nodes that haven't been already
+            return
+
+        if len(curr.children) == 1: # then n is part of the same root as curr
+            n.root_degree = curr.root_degree
+            if curr.LR_index is not None:
+                n.LR_index = curr.LR_index
+        else: # curr is a branch point (aka LR found)
+            n.root_degree = curr.root_degree + 1
+            n.LR_index = self.num_LRs
+            self.num_LRs += 1
+
+    def check_LRs(self):
+        '''
+        Verify the root degrees and LR indices that nodes were given as they were added (see index_node),
+        by working them out again for the whole tree. Returns the nodes that don't match (and warns about them).
+        '''
+        if self.top is None: # empty tree
+            return []
+
+        # walk tree breadth-first, recomputing each node's root degree, and its LR as the node the LR starts at.
+        # a node carries on its parent's root if it has the same LR index (at most one child can);
+        # any other child starts an LR of its own, one degree higher
+        degree = {self.top: 0}
+        LR = {self.top: None}
+        q = deque([self.top])
+        while q:
+            curr = q.popleft()
+            carried = False
+            for n in curr.children:
+                if not carried and n.LR_index == curr.LR_index:
+                    carried = True
+                    degree[n], LR[n] = degree[curr], LR[curr]
+                else:
+                    degree[n], LR[n] = degree[curr] + 1, n
+                q.append(n)
+
+        # each recomputed LR should match exactly one LR index, and vice versa (indices needn't be in the same order)
+        index_of = {}
+        LR_of = {}
+        mismatched = []
+        for n in self.nodes:
+            if (n.root_degree != degree[n] or index_of.setdefault(LR[n], n.LR_index) != n.LR_index
+                    or LR_of.setdefault(n.LR_index, LR[n]) is not LR[n]):
+                mismatched.append(n)
+
+        if mismatched:
+            print(f'Warning: {len(mismatched)} node(s) have the wrong root degree or LR index, e.g. at {mismatched[0].coords}')
+        return mismatched
 
 
     def popup(self):
@@ -806,6 +922,155 @@ class Tree:
         base.wait_window(top) # wait for a button to be pressed; check this still works ##
 
 
+# Reversible tree operations, for undo/redo. Each one only keeps references to the nodes
+# it changes, and lists them in touched, so the UI only has to redraw those.
+# selection is (node selected before, node selected after), either of which can be None.
+
+class AddChild:
+    '''Add a node as the last child of parent (or as the top of an empty tree, if parent is None).'''
+    def __init__(self, parent, node):
+        self.parent = parent
+        self.node = node
+        self.touched = [node]
+        self.selection = (parent, node)
+
+    def do(self, tree):
+        node, parent = self.node, self.parent
+        # remember how the indexing stood, since node gets indexed below
+        self.indexed = (node.root_degree, node.LR_index, tree.num_LRs)
+
+        if parent is None:
+            node.depth = 0
+            tree.top = node
+            node.root_degree = 0
+        else:
+            node.depth = parent.depth + 1  # child is one level lower
+            if len(parent.children) == 0:
+                if parent.root_degree == 0:
+                    node.root_degree = 0
+            parent.children.append(node)
+
+        node.parent = parent
+        node.in_tree = True
+        tree.nodes.append(node)
+        tree.grid_add(node)
+        tree.index_node(node)
+
+    def undo(self, tree):
+        node, parent = self.node, self.parent
+        assert tree.nodes[-1] is node
+        tree.nodes.pop()
+        tree.grid_remove(node)
+        node.in_tree = False
+
+        if parent is None:
+            tree.top = None
+        else:
+            parent.children.pop()
+
+        node.root_degree, node.LR_index, tree.num_LRs = self.indexed
+
+
+class InsertBetween:
+    '''Insert a node between parent and one of its children.'''
+    def __init__(self, parent, node, child):
+        self.parent = parent
+        self.node = node
+        self.child = child
+        self.touched = [node, child]
+        self.selection = (parent, node)
+
+    def do(self, tree):
+        parent, node, child = self.parent, self.node, self.child
+        self.position = parent.children.index(child)
+        del parent.children[self.position]
+        parent.children.append(node)
+        node.children = [child]
+        node.parent = parent
+        child.parent = node
+
+        # the new node joins the root it was inserted on
+        if len(parent.children) == 1:
+            source = parent
+        else:
+            source = child
+        node.root_degree = source.root_degree
+        node.LR_index = source.LR_index
+        node.pedge_color = source.pedge_color
+
+        node.depth = parent.depth + 1
+        tree.shift_depths(child, 1)
+
+        node.in_tree = True
+        tree.nodes.append(node)
+        tree.grid_add(node)
+
+    def undo(self, tree):
+        parent, node, child = self.parent, self.node, self.child
+        assert tree.nodes[-1] is node
+        tree.nodes.pop()
+        tree.grid_remove(node)
+        node.in_tree = False
+
+        parent.children.remove(node)
+        parent.children.insert(self.position, child)
+        node.children = []
+        child.parent = parent
+
+        tree.shift_depths(child, -1)
+
+
+class DeleteNode:
+    '''Delete a node, and give its children to its parent in its place.'''
+    def __init__(self, node):
+        self.node = node
+        self.parent = node.parent
+        self.touched = [node] + node.children
+        self.selection = (node, None)
+
+    def do(self, tree):
+        node, parent = self.node, self.parent
+        self.index = tree.nodes.index(node)
+        del tree.nodes[self.index]
+        tree.grid_remove(node)
+        node.in_tree = False
+
+        if parent is None:
+            assert not node.children
+            tree.top = None
+        else:
+            self.position = parent.children.index(node)
+            parent.children[self.position:self.position+1] = node.children
+
+        # a child that carries on parent's root keeps parent's degree, and any other child
+        # (e.g. an LR that branched off node) now branches off parent, one degree below it (see Tree.check_LRs)
+        self.degree_shifts = []
+        for child in node.children:
+            child.parent = parent
+            tree.shift_depths(child, -1)
+            degree = parent.root_degree if child.LR_index == parent.LR_index else parent.root_degree + 1
+            self.degree_shifts.append(degree - child.root_degree)
+            if degree != child.root_degree:
+                tree.shift_degrees(child, degree - child.root_degree)
+
+    def undo(self, tree):
+        node, parent = self.node, self.parent
+        tree.nodes.insert(self.index, node)
+        tree.grid_add(node)
+        node.in_tree = True
+
+        if parent is None:
+            tree.top = node
+        else:
+            parent.children[self.position:self.position+len(node.children)] = [node]
+
+        for child, shift in zip(node.children, self.degree_shifts):
+            child.parent = node
+            tree.shift_depths(child, 1)
+            if shift:
+                tree.shift_degrees(child, -shift)
+
+
 
 
 
@@ -828,6 +1093,9 @@ class AnalyzerUI(tk.Frame):
         self.load_button = tk.Button(self.left_frame, text='Load file(s)', command=self.import_file)
         self.load_button.pack(side='top', expand=True)
 
+        self.series_button = tk.Button(self.left_frame, text='Load time series', command=self.import_series)
+        self.series_button.pack(side='top', expand=True)
+
         # these buttons are hidden until later
         # self.analyze_button = tk.Button(self.left_frame, text='Generate report', command=self.generate_report)
         # self.clear_button = tk.Button(self.left_frame, text='Clear', command=self.clear)
@@ -854,53 +1122,24 @@ class AnalyzerUI(tk.Frame):
             i = 1
 
             # prepare a csv to store analysis results
-            timestamp = datetime.now()
-            report_dest = self.output_path / f"report_{str(timestamp.strftime('%Y%m%d_%H%M%S'))}.csv"
+            report_dest = quantify.report_dest(self.output_path)
             with open(report_dest, 'a', encoding='utf-8', newline='') as csvfile:
-                fieldnames = [
-                    'PR length',
-                    'LR count',
-                    'LR lengths',
-                    'LR angles',
-                    'primary LR density',
-                    'alpha',
-                    'material cost',
-                    'wiring cost',
-                    'scaling distance to front',
-                    'alpha (random)',
-                    'material (random)',
-                    'wiring (random)',
-                    'scaling (random)',
-                ]
-                w = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                w = csv.DictWriter(csvfile, fieldnames=quantify.REPORT_FIELDS)
                 w.writeheader()
 
                 # analyze input file(s)
                 for json_file in self.tree_paths:
                     graph_name = json_file.split("/")[-1]
-                    graph_name_noext = graph_name[:-5]
-                    pareto_name = graph_name_noext + '_pareto.png'
-                    # plot_name = graph_name_noext + '_tree.png'
-                    pareto_path = self.output_path / pareto_name
 
                     # update current file count list
                     self.output_info = self.output_info + '\n' + graph_name
                     self.output.config(text=self.output_info)
 
-                    # load and process graph data
-                    with open(json_file, mode='r') as h:
-                        data = json.load(h)
-                        graph = json_graph.adjacency_graph(data)
+                    # load and process graph data (.json, or the binary .npy copy), and save its pareto plot
+                    results = quantify.analyze_file(json_file, self.output_path)
 
-                        # perform analysis
-                        results, front, randoms = quantify.analyze(graph)
-                        results['filename'] = graph_name_noext
-
-                        # append to the results csv file
-                        w.writerow(results)
-
-                        # make pareto plot and save
-                        quantify.plot_all(front, [results['material cost'], results['wiring cost']], randoms, results['material (random)'], results['wiring (random)'], pareto_path)
+                    # append to the results csv file
+                    w.writerow(results)
 
                     print(f"Processed file {i}/{len(self.tree_paths)}")
                     i += 1
@@ -912,6 +1151,33 @@ class AnalyzerUI(tk.Frame):
             # show confirmation message
             print('Finished.')
 
+    def import_series(self):
+        '''Load the days of one or more plants and report their growth over time.'''
+        self.tree_paths = tk.filedialog.askopenfilenames(parent=self.base, initialdir='./', title='Select the days to analyze:')
+
+        if len(self.tree_paths) == 0: # no selection made
+            return
+        else:
+            self.output_path = Path(tk.filedialog.askdirectory(parent=self.base, initialdir='./', title='Select an output folder:'))
+
+            self.output_info = f'Current files: ({len(self.tree_paths)})'
+
+            # one row per plant per day
+            report_dest = quantify.report_dest(self.output_path, prefix='series')
+            with open(report_dest, 'a', encoding='utf-8', newline='') as csvfile:
+                w = csv.DictWriter(csvfile, fieldnames=quantify.SERIES_FIELDS)
+                w.writeheader()
+
+                # files are grouped by plant and analyzed in order of day
+                for i, row in enumerate(quantify.analyze_series(self.tree_paths), 1):
+                    w.writerow(row)
+
+                    self.output_info = self.output_info + '\n' + row['filename']
+                    self.output.config(text=self.output_info)
+                    print(f"Processed file {i}/{len(self.tree_paths)}")
+
+            print('Finished.')
+
 
     def clear(self):
         '''Clean up a previously imported file.'''
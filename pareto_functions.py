@@ -1,18 +1,24 @@
 import networkx as nx
 from itertools import combinations
 import numpy as np
-from bisect import bisect_left, insort
-from collections import defaultdict
+from heapq import heappush, heappop
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from sys import argv
-from scipy.spatial.distance import euclidean
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import euclidean, pdist, squareform
 import argparse
-import random
+import os
+from math import fsum
 import matplotlib.pyplot as plt
 import copy
 
 STEINER_MIDPOINTS = 10
 
 DEFAULT_ALPHAS = np.arange(0, 1.01, 0.01)
+# ways pareto_front can build each Pareto-optimal tree
+ENGINES = ('array', 'networkx', 'segments')
 
 def get_critical_nodes(G):
     '''
@@ -26,7 +32,51 @@ def get_critical_nodes(G):
     
     return critical_nodes
 
-def graph_costs(G, critical_nodes=None):
+class ParetoContext:
+    '''
+    Everything the Pareto functions need to know about a plant G, computed once per plant
+    and shared between pareto_front, every pareto_steiner_* call, satellite_tree and
+    random_tree (rather than each of them pulling it out of G again)
+
+    critical_nodes: NumPy array of the critical node ids of G, in increasing order
+    coords: matrix of the critical nodes' coordinates, one row per critical node
+    root: row of the root (node 0) in critical_nodes and coords
+    dists: matrix of pairwise distances between critical nodes (only computed when first
+    needed, since it grows quadratically with the number of tips)
+    '''
+    def __init__(self, G):
+        self.critical_nodes = np.array(sorted(get_critical_nodes(G)), dtype=int)
+        self.coords = np.array([G.nodes[u]['pos'] for u in self.critical_nodes.tolist()], dtype=float).reshape(-1, 2)
+
+        # assumes root node is 0
+        self.root = int(np.flatnonzero(self.critical_nodes == 0)[0])
+        self._dists = None
+
+    @classmethod
+    def from_arrays(cls, coords, parent):
+        '''
+        Build the context of a plant stored as arrays rather than a graph: coords[i] is the
+        position of node i and parent[i] the index of its parent (-1 for the root, node 0)
+        '''
+        parent = np.asarray(parent)
+        has_parent = parent != -1
+        degree = has_parent + np.bincount(parent[has_parent], minlength=len(parent))
+        degree[0] = 1 # the root is always critical
+
+        ctx = cls.__new__(cls)
+        ctx.critical_nodes = np.flatnonzero(degree == 1)
+        ctx.coords = np.asarray(coords, dtype=float)[ctx.critical_nodes].reshape(-1, 2)
+        ctx.root = 0
+        ctx._dists = None
+        return ctx
+
+    @property
+    def dists(self):
+        if self._dists is None:
+            self._dists = squareform(pdist(self.coords))
+        return self._dists
+
+def graph_costs(G, critical_nodes=None, weights=None):
     '''
     Uses a breadth first search to compute the wiring cost and conduction delay of G
 
@@ -36,9 +86,13 @@ def graph_costs(G, critical_nodes=None):
 
     By default, computes conduction delay for all nodes. If you specify a set of critical
     nodes, then only those nodes are used for computing conduction delay
+
+    Edge lengths are read from the 'weight' attribute of each edge, unless they are given in
+    weights, a dictionary of (u, v) : length with u the end of the edge closer to the root
     '''
-    scost = 0
-    mcost = 0
+    # membership tests below need to be O(1)
+    if critical_nodes is not None and not isinstance(critical_nodes, (set, frozenset)):
+        critical_nodes = set(critical_nodes)
 
     # dictionary that stores each node's distance to the root
     droot = {}
@@ -53,15 +107,16 @@ def graph_costs(G, critical_nodes=None):
     parent[root] = None
 
     # queue of nodes that have been discovered but not yet visited
-    queue = [root]
+    queue = deque([root])
     visited = set()
 
     # lists that store the edge lengths and the distances from the nodes to each root
     mcosts = []
     scosts = []
-    while len(queue) > 0:
+    adj = G.adj
+    while queue:
         # visit the next discovered but not yet visited node
-        curr = queue.pop(0)
+        curr = queue.popleft()
 
         # if we are trying to  visit an already-visited node, we have a cycle
         if curr in visited:
@@ -69,21 +124,23 @@ def graph_costs(G, critical_nodes=None):
 
         # we've visited curr
         visited.add(curr)
+        curr_droot = droot[curr]
+        curr_parent = parent[curr]
 
         # go through curr's children and add the unvisited ones to the queue
-        for child in G.neighbors(curr):
+        for child, data in adj[curr].items():
             # ignore curr's parent, this was already visited in the bfs
-            if child != parent[curr]:
-                length = G[curr][child]['weight']
+            if child != curr_parent:
+                length = data['weight'] if weights is None else weights[curr, child]
                 mcosts.append(length)
 
                 # to get to the root, the child must go to curr and then to the root
                 # thus, child's distance to root = distance from child to curr + distance from curr to root
-                child_droot = length + droot[curr]
+                child_droot = length + curr_droot
                 droot[child] = child_droot
 
                 # if we have specified a set of critical nodes, only those nodes contribute to conduction delay
-                if critical_nodes == None or child in critical_nodes:
+                if critical_nodes is None or child in critical_nodes:
                     scosts.append(child_droot)
                 parent[child] = curr
                 queue.append(child)
@@ -91,11 +148,89 @@ def graph_costs(G, critical_nodes=None):
     # if not every node was visited, graph is not connected
     assert len(visited) == G.number_of_nodes()
 
-    mcost = sum(sorted(mcosts))
-    scost = sum(sorted(scosts))
+    # fsum is exact, so the result doesn't depend on the order the edges were visited in
+    mcost = fsum(mcosts)
+    scost = fsum(scosts)
 
     return mcost, scost
 
+def tree_levels(parent):
+    '''
+    Nodes of a forest stored as a 1D parent array (-1 for the roots), one array per level
+    from the roots down, so every node comes after its parent. Nodes on a cycle are never
+    reached, and are left out
+    '''
+    parent = np.asarray(parent)
+    is_root = parent == -1
+
+    # children grouped by parent: those of node u are order[start[u]:start[u] + nchildren[u]]
+    # (the roots' -1s sort first)
+    order = np.argsort(parent, kind='stable')
+    nchildren = np.bincount(parent[~is_root], minlength=parent.size)
+    start = np.cumsum(nchildren) - nchildren + np.count_nonzero(is_root)
+
+    levels = []
+    level = np.flatnonzero(is_root)
+    while level.size > 0:
+        levels.append(level)
+        counts = nchildren[level]
+        first = np.cumsum(counts) - counts
+        level = order[np.repeat(start[level] - first, counts) + np.arange(counts.sum())]
+    return levels
+
+def tree_costs(parent, length, critical=None):
+    '''
+    Array version of graph_costs for trees stored as parent arrays
+
+    parent[i] is the index of node i's parent (-1 for the root) and length[i] is the length
+    of the edge from i to its parent. Both can also be 2D, one tree per row, to evaluate a
+    whole stack of trees over the same nodes in one call (e.g. a random ensemble, or the
+    tree for every alpha)
+
+    Distances to the root are accumulated from the root down, level by level, so every
+    node is visited once, after its parent, no matter what order the nodes are stored in.
+    critical is an optional boolean mask or index array of the nodes that count towards
+    conduction delay (default is every node)
+
+    Returns (mcost, scost) as floats for a single tree, or as two arrays for a stack. Trees
+    that contain a cycle get infinite costs, as in graph_costs
+    '''
+    parent = np.asarray(parent)
+    length = np.asarray(length, dtype=float)
+    single = parent.ndim == 1
+    parent = np.atleast_2d(parent)
+    length = np.atleast_2d(length)
+    ntrees, nnodes = parent.shape
+
+    # number the nodes of the whole stack consecutively, tree by tree
+    is_root = parent == -1
+    length = np.where(is_root, 0.0, length)
+    # fsum is exact, so (as in graph_costs) the totals don't depend on the order the nodes are stored in
+    mcost = np.array([fsum(row) for row in length.tolist()])
+    up = np.where(is_root, -1, parent + (np.arange(ntrees) * nnodes)[:, None]).ravel()
+    length = length.ravel()
+
+    # accumulate the distance to the root down from the roots, one level at a time
+    levels = tree_levels(up)
+    droot = np.zeros(up.size)
+    reached = np.zeros(up.size, dtype=bool)
+    for level in levels:
+        reached[level] = True
+        droot[level] = droot[up[level]] + length[level]
+    droot = droot.reshape(ntrees, nnodes)
+
+    # every node should hang off the (single) root
+    is_tree = (is_root.sum(axis=1) == 1) & reached.reshape(ntrees, nnodes).all(axis=1)
+
+    if critical is not None:
+        droot = droot[:, critical]
+    scost = np.where(is_tree, [fsum(row) for row in droot.tolist()], np.inf)
+    mcost = np.where(is_tree, mcost, np.inf)
+
+    if single:
+        return float(mcost[0]), float(scost[0])
+    return mcost, scost
+
 def slope_vector(p1, p2):
     '''
     Given two n-dimensional points, computes the slope m between p1 and p2
@@ -212,11 +347,122 @@ def k_nearest_neighbors(G, u, k=None, candidate_nodes=None):
         nearest_neighbors = nearest_neighbors[:k]
     return nearest_neighbors
 
-def satellite_tree(G):
+class NearestOutIndex:
+    '''
+    Spatial index over a set of points that answers "which of the remaining points is
+    closest to this one?", with points being removed as they get connected to the tree
+
+    Built on scipy's KD-tree. KD-trees can't delete points, so removed points are skipped at
+    query time, and the KD-tree is rebuilt over the remaining points once rebuild_fraction of
+    the points it holds have been removed (rebuilding is cheap next to querying past removed
+    points over and over). Ties in distance go to the lowest row, which is the order
+    k_nearest_neighbors would have put them in
+
+    Rather than a full sorted list of every point, each query point (identified by a key,
+    e.g. its node in the tree) keeps a short list of its k nearest neighbors at the time of
+    its last query. Since points only ever get removed, the first remaining point on that
+    list is still the closest one, and the KD-tree is only queried again once the whole list
+    has been removed. Every time that happens, the key's list doubles in length (up to
+    max_k), so keys that keep losing their neighbors stop paying for a query each time
+    '''
+    def __init__(self, coords, k=32, max_k=256, rebuild_fraction=1/16):
+        self.coords = np.asarray(coords, dtype=float)
+        self.remaining = np.ones(len(self.coords), dtype=bool)
+        self.k = k
+        self.max_k = max_k
+        self.rebuild_fraction = rebuild_fraction
+        self.neighbors = {}
+        self.cursor = {}
+        self.next_k = {}
+        self.rebuild()
+
+    def rebuild(self):
+        '''Build a fresh KD-tree over the points that haven't been removed.'''
+        self.rows = np.flatnonzero(self.remaining)
+        self.kdtree = cKDTree(self.coords[self.rows])
+        self.removed_since_rebuild = 0
+
+    def remove(self, row):
+        '''Remove a point from the index (it has been added to the tree).'''
+        assert self.remaining[row]
+        self.remaining[row] = False
+        self.removed_since_rebuild += 1
+        if self.removed_since_rebuild > self.rebuild_fraction * len(self.rows) and self.remaining.any():
+            self.rebuild()
+
+    def query(self, points, k=None):
+        '''
+        Given an array of points, return for each one a list of remaining rows sorted by
+        distance (ties by row), which includes every remaining point closer than the last
+        row on the list
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        neighbors = [None] * len(points)
+        pending = np.arange(len(points))
+
+        # start with k neighbors per point, and ask for more for the points whose
+        # neighbors were all removed already (or were all tied with the k-th neighbor)
+        k = min(k or self.k, len(self.rows))
+        while len(pending) > 0:
+            dists, idx = self.kdtree.query(points[pending], k=k)
+            dists = dists.reshape(len(pending), -1)
+            rows = self.rows[idx.reshape(len(pending), -1)]
+
+            # anything as far as the k-th neighbor might be tied with a point past it
+            keep = self.remaining[rows]
+            if k < len(self.rows):
+                keep &= dists < dists[:, -1:]
+
+            unsettled = []
+            for i in range(len(pending)):
+                if keep[i].any():
+                    order = np.lexsort((rows[i][keep[i]], dists[i][keep[i]]))
+                    neighbors[pending[i]] = rows[i][keep[i]][order].tolist()
+                else:
+                    unsettled.append(i)
+            pending = pending[unsettled]
+            k = min(2 * k, len(self.rows))
+
+        return neighbors
+
+    def closest(self, keys, points):
+        '''
+        For each key, return the row of the closest remaining point to points[key]
+        '''
+        closest = []
+        requery = []
+        for i, key in enumerate(keys):
+            neighbors = self.neighbors.get(key, [])
+            j = self.cursor.get(key, 0)
+            while j < len(neighbors) and not self.remaining[neighbors[j]]:
+                j += 1
+            self.cursor[key] = j
+            if j < len(neighbors):
+                closest.append(neighbors[j])
+            else:
+                closest.append(None)
+                requery.append(i)
+
+        if len(requery) > 0:
+            k = max(self.next_k.get(keys[i], self.k) for i in requery)
+            for i, neighbors in zip(requery, self.query([points[keys[i]] for i in requery], k)):
+                key = keys[i]
+                self.neighbors[key] = neighbors[:self.next_k.get(key, self.k)]
+                self.cursor[key] = 0
+                self.next_k[key] = min(2 * self.next_k.get(key, self.k), self.max_k)
+                closest[i] = neighbors[0]
+
+        return closest
+
+def satellite_tree(G, ctx=None):
     '''
     Constructs the satellite tree out of G; this is a graph in which every node is connected
     to the root by a direct line
+
+    ctx is G's ParetoContext (built from G if not given)
     '''
+    if ctx is None:
+        ctx = ParetoContext(G)
 
     # assume the root is node 0
     root = 0
@@ -225,22 +471,22 @@ def satellite_tree(G):
 
     H.add_node(root)
     H.nodes[root]['droot'] = 0
-    root_pos = G.nodes[root]['pos']
-    H.nodes[root]['pos'] = root_pos
+    H.nodes[root]['pos'] = tuple(ctx.coords[ctx.root].tolist())
 
-    critical_nodes = get_critical_nodes(G)
+    # only the distances to the root are needed, not the whole pairwise matrix
+    droot = np.hypot(*(ctx.coords - ctx.coords[ctx.root]).T)
 
     # connect every critical node to the root with a direct edge
-    for u in critical_nodes:
+    for i, u in enumerate(ctx.critical_nodes.tolist()):
         if u == root:
             continue
         H.add_edge(root, u)
-        H.nodes[u]['pos'] = G.nodes[u]['pos']
-        H[root][u]['weight'] = node_dist(G, root, u)
+        H.nodes[u]['pos'] = tuple(ctx.coords[i].tolist())
+        H[root][u]['weight'] = float(droot[i])
 
     return H
 
-def pareto_steiner_fast(G, alpha):
+def pareto_steiner_fast(G, alpha, ctx=None):
     '''
     Given a graph G and a value 0 <= alpha <= 1, compute the Pareto-optimal tree connecting
     the root to all of the lateral root tips of G
@@ -254,23 +500,29 @@ def pareto_steiner_fast(G, alpha):
 
     The algorithm uses a greedy approach: always take the edge that will reduce the
     pareto cost of the tree by the smallest amount
+
+    ctx is G's ParetoContext (built from G if not given)
     '''
     assert 0 <= alpha <= 1
 
+    if ctx is None:
+        ctx = ParetoContext(G)
+
     # assume the root is node 0
     root = 0
 
+    critical_nodes = ctx.critical_nodes.tolist()
+    critical_pos = dict(zip(critical_nodes, map(tuple, ctx.coords.tolist())))
+
     H = nx.Graph()
 
     H.add_node(root)
     # every node will keep track of its distance to the root
     H.nodes[root]['droot'] = 0
-    root_pos = G.nodes[root]['pos']
+    root_pos = critical_pos[root]
     H.nodes[root]['pos'] = root_pos
     added_nodes = 1
 
-    critical_nodes = get_critical_nodes(G)
-
     # critical nodes that have currently been added to the tree
     in_nodes = set([root])
 
@@ -282,13 +534,12 @@ def pareto_steiner_fast(G, alpha):
     graph_scost = 0
 
     '''
-    closest_neighbors is a dictionary. The keys are nodes that are currently in the tree.
-    The value associated with each node u is list of nodes that need to  be added to the
-    tree, sorted in order of how close each node is to u.
+    out_index is a spatial index over the critical nodes that have not yet been added to the
+    tree. It tells us the closest one to any node in the tree, on demand.
     '''
-    closest_neighbors = {}
-    for u in critical_nodes:
-        closest_neighbors[u] = k_nearest_neighbors(G, u, k=None, candidate_nodes=critical_nodes[:])
+    out_index = NearestOutIndex(ctx.coords)
+    critical_rows = {u : i for i, u in enumerate(critical_nodes)}
+    out_index.remove(critical_rows[root])
 
     '''
     unpaired_nodes contains the set of nodes for which we need to (re)-compute the closest
@@ -308,53 +559,24 @@ def pareto_steiner_fast(G, alpha):
     not been added to the  tree. This is because any other combination would never be the
     optimal greedy choice.
 
-    best_edges stores all of these potentially optimal edges to add
+    best_edges is a binary heap of these potentially optimal edges to add, keyed on cost
     '''
     best_edges = []
 
-    while added_nodes < len(critical_nodes):
-        assert len(out_nodes) > 0
-        best_edge = None
-        best_mcost = None
-        best_scost = None
-        best_cost = float("inf")
+    def pair(nodes):
+        '''
+        For each node u in the tree, find u's closest neighbor that has not been added to
+        the tree, and push the edge connecting the two onto best_edges
+        '''
+        closest_rows = out_index.closest(nodes, H.nodes.data('pos'))
 
-        best_choice = None
-        best_midpoint = None
-
-        # go through nodes for which we need to (re)-compute its closest neighbor outside the tree
-        for u in unpaired_nodes:
-            assert H.has_node(u)
+        for u, row in zip(nodes, closest_rows):
             assert 'droot' in H.nodes[u]
-
-            invalid_neighbors = []
-            closest_neighbor = None
-            '''
-            Go through u's closest neighbors and find the closest one that has not been
-            added to the tree
-            '''
-            for i in range(len(closest_neighbors[u])):
-                v = closest_neighbors[u][i]
-                if H.has_node(v):
-                    invalid_neighbors.append(v)
-                else:
-                    # once we find the closest neighbor not in the tree,
-                    closest_neighbor = v
-                    break
-
-            '''
-            if any of the closest neighbors are no longer valid partners, remove them from
-            the list of closest neighbors
-            '''
-            for invalid_neighbor in invalid_neighbors:
-                closest_neighbors[u].remove(invalid_neighbor)
-
-            assert closest_neighbor != None
+            closest_neighbor = critical_nodes[row]
             assert not H.has_node(closest_neighbor)
 
-
             p1 = H.nodes[u]['pos']
-            p2 = G.nodes[closest_neighbor]['pos']
+            p2 = critical_pos[closest_neighbor]
 
             # compute hypothetical cost of connecting u to its closest neighbor
             length = point_dist(p1, p2)
@@ -362,33 +584,39 @@ def pareto_steiner_fast(G, alpha):
             scost = length + H.nodes[u]['droot']
             cost = pareto_cost(mcost=mcost, scost=scost, alpha=alpha)
 
-            # add this candidate edge to the list of best edges
-            # insort maintains the list in sorted order based on cost
-            insort(best_edges, (cost, u, closest_neighbor))
+            # add this candidate edge to the heap of best edges
+            heappush(best_edges, (cost, u, closest_neighbor))
+
+    while added_nodes < len(critical_nodes):
+        assert len(out_nodes) > 0
 
-        # We will add the candidate edge with the smallest cost
-        # because we maintained these edges in sorted order, it's O(1) to get the next edge to add
-        cost, u, v = best_edges.pop(0)
+        # go through nodes for which we need to (re)-compute its closest neighbor outside the tree
+        pair(list(unpaired_nodes))
+
+        '''
+        We will add the candidate edge with the smallest cost, which is always at the top of
+        the heap. Edges whose target has been added to the tree since they were pushed are
+        stale. Rather than purging them after every step, we discard them when they reach the
+        top and push the next-best edge for their source node instead. Pairing a node with a
+        farther neighbor can only raise its cost, so the first valid edge popped is the same
+        edge a full rebuild would have picked
+        '''
+        cost, u, v = heappop(best_edges)
+        while H.has_node(v):
+            pair([u])
+            cost, u, v = heappop(best_edges)
 
-        # go through all the candidate edges and see which ones are no longer valid
-        best_edges2 = []
         # u and v are now unpaired, we need to find their respective closest neighbors outside of the tree
         unpaired_nodes = set([u, v])
-        for cost, x, y in best_edges:
-            # if another node had v as its closet neighbor, we need to find its next-closest neighbor going forward
-            if y == v:
-                unpaired_nodes.add(x)
-            else:
-                best_edges2.append((cost, x, y))
-        best_edges = best_edges2
 
         assert H.has_node(u)
         assert not H.has_node(v)
         H.add_node(v)
-        H.nodes[v]['pos'] = G.nodes[v]['pos']
+        H.nodes[v]['pos'] = critical_pos[v]
         # v is now in the tree, not outside the tree
         in_nodes.add(v)
         out_nodes.remove(v)
+        out_index.remove(critical_rows[v])
 
         # connect u to v, adding several midpoints along the way
         p1 = H.nodes[u]['pos']
@@ -403,19 +631,6 @@ def pareto_steiner_fast(G, alpha):
             H.add_node(midpoint_node)
             H.nodes[midpoint_node]['pos'] = midpoint
 
-            # get the distance from the midpoint  to all nodes that need to be added to t he tree
-            neighbors = []
-            for out_node in out_nodes:
-                out_coord = G.nodes[out_node]['pos']
-                dist = point_dist(midpoint, out_coord)
-                neighbors.append((dist, out_node))
-
-            # add the newly-added midpoint node to closest_neighbors
-            neighbors = sorted(neighbors)
-            closest_neighbors[midpoint_node] = []
-            for dist, neighbor in neighbors:
-                closest_neighbors[midpoint_node].append(neighbor)
-
             midpoint_nodes.append(midpoint_node)
 
             # midpoint_node is unpaired, we need to add it to the candidate edges in the next iteration
@@ -434,77 +649,483 @@ def pareto_steiner_fast(G, alpha):
         added_nodes += 1
     return H
 
-def pareto_front(G):
+def pareto_steiner_array(G, alpha, build_tree=False, ctx=None):
+    '''
+    Array-backed version of pareto_steiner_fast. Makes the same greedy choices and builds
+    the same tree, but never touches a networkx graph while doing so
+
+    Every node of the tree (critical nodes and Steiner midpoints alike) gets a slot in a set
+    of preallocated NumPy arrays holding its position, its parent, the length of the edge to
+    its parent and its distance to the root. Critical nodes take the first slots in order
+    of node id, and midpoints take the following slots in the order they are created, so
+    comparing slots is the same as comparing node ids in pareto_steiner_fast
+
+    Returns the wiring cost and conduction delay of the tree, with only the critical nodes
+    contributing to conduction delay (exactly what graph_costs would report). If build_tree
+    is True, the equivalent networkx tree is built at the end and returned as well
+
+    ctx is G's ParetoContext. If it is given, G itself is never looked at (and can be None)
+    '''
+    assert 0 <= alpha <= 1
+
+    if ctx is None:
+        ctx = ParetoContext(G)
+
+    critical_nodes = ctx.critical_nodes.tolist()
+    ncritical = len(critical_nodes)
+    coords = ctx.coords
+
+    # the root is node 0, which is the first critical node in id order
+    root = ctx.root
+    assert root == 0
+
+    # parameters t along each edge at which midpoints get placed, as in steiner_points
+    ts = []
+    t = delta = 1.0 / (STEINER_MIDPOINTS + 1)
+    while t < 1:
+        ts.append(t)
+        t += delta
+
+    # every accepted edge adds one critical node and len(ts) midpoints
+    nslots = ncritical + len(ts) * (ncritical - 1)
+    pos = np.zeros((nslots, 2))
+    pos[:ncritical] = coords
+    parent = np.full(nslots, -1, dtype=int)
+    length = np.zeros(nslots)
+    # droot is the straight-line distance used by the greedy choice, while dpath is the
+    # distance to the root along the tree edges (which is what graph_costs measures)
+    droot = np.zeros(nslots)
+    dpath = np.zeros(nslots)
+
+    in_tree = np.zeros(ncritical, dtype=bool)
+    in_tree[root] = True
+
+    # spatial index over the critical slots that are still outside the tree
+    out_index = NearestOutIndex(coords)
+    out_index.remove(root)
+
+    unpaired_nodes = set([root])
+    best_edges = []
+    next_slot = ncritical
+    added_nodes = 1
+
+    def pair(slots):
+        '''Push the edge from each slot to its closest critical slot outside the tree onto best_edges.'''
+        for u, closest_neighbor in zip(slots, out_index.closest(slots, pos)):
+            length_uv = point_dist(pos[u].tolist(), coords[closest_neighbor].tolist())
+            cost = pareto_cost(mcost=length_uv, scost=length_uv + droot[u], alpha=alpha)
+            heappush(best_edges, (cost, u, closest_neighbor))
+
+    while added_nodes < ncritical:
+        pair(list(unpaired_nodes))
+
+        # stale edges (whose target has since joined the tree) are re-paired lazily, as in pareto_steiner_fast
+        cost, u, v = heappop(best_edges)
+        while in_tree[v]:
+            pair([u])
+            cost, u, v = heappop(best_edges)
+
+        unpaired_nodes = set([u, v])
+
+        assert not in_tree[v]
+        in_tree[v] = True
+        out_index.remove(v)
+
+        # connect u to v through the midpoints, walking out from u
+        p1 = pos[u].tolist()
+        slope = slope_vector(p1, pos[v].tolist())
+        prev = u
+        for t in ts:
+            curr = next_slot
+            next_slot += 1
+            pos[curr] = delta_point(p1, slope, t)
+            unpaired_nodes.add(curr)
+
+            parent[curr] = prev
+            prev = curr
+        parent[v] = prev
+
+        for curr in list(range(next_slot - len(ts), next_slot)) + [v]:
+            length[curr] = point_dist(pos[parent[curr]].tolist(), pos[curr].tolist())
+            droot[curr] = point_dist(pos[curr].tolist(), p1) + droot[u]
+            dpath[curr] = length[curr] + dpath[parent[curr]]
+
+        added_nodes += 1
+
+    # fsum is exact, so the costs match graph_costs exactly
+    mcost = fsum(length[parent != -1].tolist())
+    scost = fsum(np.delete(dpath[:ncritical], root).tolist())
+
+    if not build_tree:
+        return mcost, scost
+
+    # midpoint slots map onto the same node ids pareto_steiner_fast would give them
+    node_ids = critical_nodes + list(range(max(critical_nodes) + 1, max(critical_nodes) + 1 + nslots - ncritical))
+
+    H = nx.Graph()
+    for s in range(nslots):
+        H.add_node(node_ids[s], pos=tuple(pos[s].tolist()), droot=droot[s].item())
+    for s in np.flatnonzero(parent != -1):
+        H.add_edge(node_ids[parent[s]], node_ids[s], weight=length[s].item())
+
+    return mcost, scost, H
+
+def segment_attachment(start, end, droot_start, points, alpha):
+    '''
+    For the tree edge running from start (the end closer to the root) to end, find where
+    on it each of points would best be attached
+
+    Attaching a point at distance s along the edge costs |p - point| of wiring and puts the
+    point |p - point| + droot_start + s from the root, so its pareto cost is
+    |p - point| + (1 - alpha) * (droot_start + s). Along the edge this is minimized in closed
+    form, at the projection of the point moved back towards start by
+    (1 - alpha) * h / sqrt(1 - (1 - alpha)**2), where h is the point's distance from the line
+
+    Returns the pareto costs, distances s along the edge and attachment points, all as arrays
+    '''
+    c = 1 - alpha
+    direction = end - start
+    L = np.hypot(*direction)
+    rel = points - start
+
+    if L > 0:
+        direction = direction / L
+        proj = rel @ direction
+        h = np.abs(rel[:, 0] * direction[1] - rel[:, 1] * direction[0])
+        if c < 1:
+            s = proj - c * h / np.sqrt(1 - c * c)
+        else:
+            # when only conduction delay counts, every step along the edge costs as much as it saves
+            s = np.zeros(len(points))
+        s = np.clip(s, 0, L)
+    else:
+        s = np.zeros(len(points))
+
+    attach = start + s[:, None] * direction
+    cost = np.hypot(*(points - attach).T) + c * (droot_start + s)
+    return cost, s, attach
+
+def pareto_steiner_segments(G, alpha, build_tree=False, ctx=None):
+    '''
+    Pareto-optimal tree for G and alpha, like pareto_steiner_array, but without Steiner
+    midpoints: every tree edge is treated as a segment, and a new critical node can attach
+    to the best point anywhere along it (see segment_attachment), which splits the edge there
+
+    Every critical node outside the tree keeps its cheapest attachment over all the edges in
+    the tree. Splitting an edge doesn't change any of those (the two halves cover the same
+    points, at the same distances to the root), so after each step only the one new edge has
+    to be checked, against every node still outside the tree. The greedy step then takes the
+    cheapest attachment overall, out of every edge and every node rather than just each tree
+    node's nearest neighbor
+
+    Slots are laid out as in pareto_steiner_array (critical nodes in id order, then the
+    attachment points in the order they are created). Returns the wiring cost and conduction
+    delay of the tree and, if build_tree is True, the equivalent networkx tree
+
+    ctx is G's ParetoContext. If it is given, G itself is never looked at (and can be None)
+    '''
+    assert 0 <= alpha <= 1
+
+    if ctx is None:
+        ctx = ParetoContext(G)
+
+    critical_nodes = ctx.critical_nodes.tolist()
+    ncritical = len(critical_nodes)
+    coords = ctx.coords
+
+    root = ctx.root
+    assert root == 0
+
+    # every critical node adds at most one attachment point
+    nslots = 2 * ncritical - 1
+    pos = np.zeros((nslots, 2))
+    pos[:ncritical] = coords
+    parent = np.full(nslots, -1, dtype=int)
+    length = np.zeros(nslots)
+    droot = np.zeros(nslots)
+    next_slot = ncritical
+
+    # cheapest attachment of each critical node so far: its cost, the edge (named by the slot
+    # at its far end, or the root itself) and the attachment point and its distance to the root
+    # to begin with, the tree is just the root
+    best_cost = np.hypot(*(coords - coords[root]).T)
+    best_edge = np.full(ncritical, root)
+    best_droot = np.zeros(ncritical)
+    best_point = np.tile(coords[root], (ncritical, 1))
+    best_cost[root] = np.inf
+
+    for _ in range(ncritical - 1):
+        v = int(np.argmin(best_cost))
+        best_cost[v] = np.inf
+        edge, d, point = int(best_edge[v]), best_droot[v], best_point[v]
+
+        if edge == root:
+            u = root
+        else:
+            # the edge may have been split since, so find the piece the point is on now
+            while droot[parent[edge]] > d:
+                edge = parent[edge]
+            top = parent[edge]
+            if d <= droot[top]:
+                u = top
+            elif d >= droot[edge]:
+                u = edge
+            else:
+                u = next_slot
+                next_slot += 1
+                pos[u] = point
+                parent[u], length[u], droot[u] = top, np.hypot(*(point - pos[top])), d
+                parent[edge], length[edge] = u, np.hypot(*(pos[edge] - point))
+
+        parent[v] = u
+        length[v] = np.hypot(*(pos[v] - pos[u]))
+        droot[v] = droot[u] + length[v]
+
+        # check the new edge u-v against every node still outside the tree
+        out = np.flatnonzero(np.isfinite(best_cost))
+        if len(out) == 0:
+            break
+        cost, s, attach = segment_attachment(pos[u], pos[v], droot[u], coords[out], alpha)
+        better = cost < best_cost[out]
+        out = out[better]
+        best_cost[out] = cost[better]
+        best_edge[out] = v
+        best_droot[out] = droot[u] + s[better]
+        best_point[out] = attach[better]
+
+    mcost = fsum(length[parent != -1].tolist())
+    scost = fsum(np.delete(droot[:ncritical], root).tolist())
+
+    if not build_tree:
+        return mcost, scost
+
+    node_ids = critical_nodes + list(range(max(critical_nodes) + 1, max(critical_nodes) + 1 + next_slot - ncritical))
+
+    H = nx.Graph()
+    for s in range(next_slot):
+        H.add_node(node_ids[s], pos=tuple(pos[s].tolist()), droot=droot[s].item())
+    for s in np.flatnonzero(parent[:next_slot] != -1):
+        H.add_edge(node_ids[parent[s]], node_ids[s], weight=length[s].item())
+
+    return mcost, scost, H
+
+def front_point(alpha, engine, ctx):
+    '''
+    Compute the [wiring cost, conduction delay] of the Pareto-optimal tree for a single alpha,
+    using nothing but the plant's ParetoContext
+    '''
+    H = None
+    # if alpha = 0 compute the satellite tree in linear time
+    if alpha == 0:
+        H = satellite_tree(None, ctx=ctx)
+    elif engine == 'array':
+        return list(pareto_steiner_array(None, alpha, ctx=ctx))
+    elif engine == 'segments':
+        return list(pareto_steiner_segments(None, alpha, ctx=ctx))
+    else:
+        H = pareto_steiner_fast(None, alpha, ctx=ctx)
+
+    # compute the wiring cost and conduction delay
+    # only the original critical nodes contribute to conduction delay
+    mcost, scost = graph_costs(H, critical_nodes=set(ctx.critical_nodes.tolist()))
+    return [mcost, scost]
+
+# the ParetoContext of the plant being swept, in each pareto_front worker process
+_worker_ctx = None
+
+def _init_front_worker(ctx):
+    '''Receive the plant's geometry, once per worker process.'''
+    global _worker_ctx
+    _worker_ctx = ctx
+
+def _front_point_worker(alpha, engine):
+    return front_point(alpha, engine, _worker_ctx)
+
+def front_pool(ctx, workers):
+    '''
+    Process pool for computing front points with ctx, or a do-nothing context manager
+    when workers is 1 (in which case front_points runs in this process)
+    '''
+    if workers == 1:
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_front_worker, initargs=(ctx,))
+
+def front_points(alphas, engine, ctx, pool=None, workers=1):
+    '''
+    Compute front_point for each of alphas, in order, on pool (of that many workers) if
+    one is given
+    '''
+    if pool is None:
+        return [front_point(alpha, engine, ctx) for alpha in alphas]
+
+    # hand out alphas a few at a time, so workers stay busy without a round trip per alpha
+    chunksize = max(1, len(alphas) // (4 * workers))
+    return list(pool.map(_front_point_worker, alphas, [engine] * len(alphas), chunksize=chunksize))
+
+def pareto_front(G, engine='array', ctx=None, workers=1, actual=None):
     '''
     Given a graph G, compute the Pareto front of optimal solutions
 
     This allows to compare how G was connected and how G could have been connected had it
     been trying to optimize wiring cost and conduction delay
+
+    engine picks how each Pareto-optimal tree is built: 'array' (the default) uses
+    pareto_steiner_array and never builds the trees, while 'networkx' builds every tree
+    with pareto_steiner_fast and then measures it with graph_costs. 'segments' uses
+    pareto_steiner_segments, which attaches tips anywhere along the tree's edges instead
+    of at fixed midpoints (so its front is a little different from the other two)
+
+    ctx is G's ParetoContext. It is built here if not given, and shared by every tree on the front
+
+    workers is the number of processes to spread the alphas over (None for one per CPU).
+    The ParetoContext is sent to each worker once, when the worker starts, rather than once
+    per alpha. With the default of 1, everything runs in this process
+
+    actual is G's (wiring cost, conduction delay), if already known. Given both ctx and
+    actual, G itself is never looked at (and can be None)
     '''
+    assert engine in ENGINES
+
+    if ctx is None:
+        ctx = ParetoContext(G)
 
-    critical_nodes = get_critical_nodes(G)
-    
     # test: compute the actual mcost, scost for the original plant
-    mactual, sactual = graph_costs(G, critical_nodes=critical_nodes)
-    actual = (mactual, sactual)
+    if actual is None:
+        mactual, sactual = graph_costs(G, critical_nodes=set(ctx.critical_nodes.tolist()))
+        actual = (mactual, sactual)
 
     # dictionary of mcosts, scosts for each alpha value on the front
     front = {}
 
-    for alpha in DEFAULT_ALPHAS:
-        H = None
-        # if alpha = 0 compute the satellite tree in linear time
-        if alpha == 0:
-            H = satellite_tree(G)
-        else:
-            H = pareto_steiner_fast(G, alpha)
-
-        # compute the wiring cost and conduction delay
-        # only the original critical nodes contribute to conduction delay
-        mcost, scost = graph_costs(H, critical_nodes=critical_nodes)
-        front[alpha] = [mcost, scost]
+    if workers is None:
+        workers = os.cpu_count()
+    with front_pool(ctx, workers) as pool:
+        for alpha, point in zip(DEFAULT_ALPHAS, front_points(DEFAULT_ALPHAS, engine, ctx, pool, workers)):
+            front[alpha] = point
 
     return front, actual
 
 
-def random_tree(G):
+def adaptive_front(G, engine='array', ctx=None, workers=1, coarse=10, depth=3, closest_depth=7, tol=0.02, actual=None):
+    '''
+    Compute the Pareto front of G like pareto_front, but sample alpha adaptively instead
+    of on the fixed DEFAULT_ALPHAS grid
+
+    The sweep starts with `coarse` equal steps from 0 to 1. Each round then bisects the
+    steps whose two front points differ by more than tol (as a fraction of the front's
+    extent in wiring cost or conduction delay), down to `depth` halvings, and the steps on
+    either side of the alpha closest to G's actual tree, down to `closest_depth` halvings.
+    By default that places the bends of the front to within 1/80 and the characteristic
+    alpha to within 1/1280, while flat stretches of the front only get a handful of trees
+
+    Returns front, actual, characteristic_alpha, scaling_distance: front is a dict
+    {alpha : [mcost, scost]} in increasing alpha order, as from pareto_front, and the last
+    two are what quantify.distance_from_front would report for actual on that front. As in
+    pareto_front, actual can be passed in (and then G can be None, if ctx is given too)
     '''
-    Given a graph G, compute 1000 random spanning trees as in Conn et al. 2017.
+    assert engine in ENGINES
+
+    if ctx is None:
+        ctx = ParetoContext(G)
+
+    if actual is None:
+        actual = graph_costs(G, critical_nodes=set(ctx.critical_nodes.tolist()))
+    mactual, sactual = actual
+
+    # alphas are kept as integer steps of the finest resolution, so bisecting is exact
+    finest = coarse * 2 ** closest_depth
+    # steps narrower than this are only bisected next to the closest alpha
+    narrowest = 2 ** (closest_depth - depth)
+    points = {}
+
+    def scaling(step):
+        mcost, scost = points[step]
+        return max(mactual / mcost, sactual / scost)
+
+    if workers is None:
+        workers = os.cpu_count()
+    with front_pool(ctx, workers) as pool:
+        todo = list(range(0, finest + 1, 2 ** closest_depth))
+        while todo:
+            for step, point in zip(todo, front_points([step / finest for step in todo], engine, ctx, pool, workers)):
+                points[step] = point
+
+            steps = sorted(points)
+            mspan = abs(points[0][0] - points[finest][0]) or 1
+            sspan = abs(points[0][1] - points[finest][1]) or 1
+            closest = min(steps, key=scaling)
+
+            todo = set()
+            for lo, hi in zip(steps, steps[1:]):
+                if hi - lo < 2:
+                    continue
+                dm = abs(points[hi][0] - points[lo][0]) / mspan
+                ds = abs(points[hi][1] - points[lo][1]) / sspan
+                if (hi - lo > narrowest and max(dm, ds) > tol) or closest in (lo, hi):
+                    todo.add((lo + hi) // 2)
+            todo = sorted(todo)
+
+    front = {step / finest : points[step] for step in sorted(points)}
+    closest = min(points, key=scaling)
+
+    return front, actual, closest / finest, scaling(closest)
+
+def random_tree(G, ctx=None, n=1000, seed=None, batch=100):
+    '''
+    Given a graph G, compute the costs of n random spanning trees as in Conn et al. 2017.
     Only consider the critical nodes (and root node) of G.
+
+    Each tree is built by adding the critical nodes in a random order, joining every new
+    node to a uniformly random node already in the tree. Trees are generated `batch` at a
+    time as parent arrays and only their (mcost, scost) pairs are kept.
+
+    ctx is G's ParetoContext (built from G if not given); seed seeds the generator
     '''
-    random.seed(a=None)
-    random_trees = [] # list of 1000 random trees
+    if ctx is None:
+        ctx = ParetoContext(G)
+
+    rng = np.random.default_rng(seed)
     costs = []
 
-    for i in range(1000): # 1000 random trees
-        # instantiate random tree
-        R = nx.Graph()
-        G_critical_nodes = get_critical_nodes(G)
-
-        while len(G_critical_nodes) > 0:
-            # randomly draw 1 node from G's critical nodes
-            index = random.randrange(len(G_critical_nodes))
-            g = G_critical_nodes[index]
-
-            if len(R.nodes) > 0: # if R is not empty
-                # add the new point AND a random edge
-                r_index = random.randrange(len(R.nodes)) # get a random node from R
-                r = list(R.nodes)[r_index]
-                R.add_node(g, pos=G.nodes.data()[g]['pos'])
-                R.add_edge(r, g, weight=node_dist(R, r, g))
-
-            else: # if R is empty
-                # add the new point
-                R.add_node(g, pos=G.nodes.data()[g]['pos'])
-            
-            # remove added node from candidate list and repeat
-            del G_critical_nodes[index] 
-        
-        random_trees.append(R)
-
-    for R in random_trees:
-        # compute costs for each R, to compare with G
-        mactual, sactual = graph_costs(R)
-        costs.append((mactual, sactual))
-    
-    return costs
\ No newline at end of file
+    for done in range(0, n, batch):
+        mcosts, scosts = random_tree_batch(ctx, min(batch, n - done), rng)
+        costs.extend(zip(mcosts.tolist(), scosts.tolist()))
+
+    return costs
+
+def random_tree_batch(ctx, n, rng):
+    '''
+    Generate n random spanning trees over the rows of ctx and return their wiring costs
+    and conduction delays as two arrays of length n
+
+    Trees are stored by insertion position: position i holds row order[:, i] and is joined
+    to position parent[:, i], drawn uniformly from 0..i-1. Position 0 is the first node
+    added, which is usually not the root, so the path from the root back to position 0 is
+    flipped before the trees are handed to tree_costs.
+    '''
+    k = len(ctx.critical_nodes)
+    trees = np.arange(n)
+
+    order = np.argsort(rng.random((n, k)), axis=1)
+    parent = np.full((n, k), -1)
+    parent[:, 1:] = (rng.random((n, k - 1)) * np.arange(1, k)).astype(int)
+
+    # length of the edge from each position to its parent, straight from the coordinates
+    # (O(n k) per batch, rather than the k x k matrix of ctx.dists)
+    offset = ctx.coords[order] - ctx.coords[order[trees[:, None], np.maximum(parent, 0)]]
+    length = np.hypot(offset[..., 0], offset[..., 1])
+
+    # reroot at the root: walk from the root up to position 0, turning each edge around
+    curr = np.argmax(order == ctx.root, axis=1)
+    prev = np.full(n, -1)
+    prev_length = np.zeros(n)
+    while np.any(curr != -1):
+        walking = trees[curr != -1]
+        c = curr[walking]
+        up, up_length = parent[walking, c], length[walking, c]
+        parent[walking, c] = prev[walking]
+        length[walking, c] = prev_length[walking]
+        prev[walking], prev_length[walking] = c, up_length
+        curr[walking] = up
+
+    return tree_costs(parent, length)
@@ -8,128 +8,309 @@ Time series
 '''
 
 import argparse
+import csv
 import networkx as nx
 import math
-from queue import Queue
-from pareto_functions import pareto_front, random_tree
+from pareto_functions import pareto_front, adaptive_front, random_tree, graph_costs, tree_costs, tree_levels, ParetoContext
+from cache import LastResult, pareto_key
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import re
 import pickle
 import numpy as np
-from collections import Counter
-import copy
+from collections import Counter, deque, namedtuple
+import json
+from datetime import datetime
+from pathlib import Path
+from networkx.readwrite import json_graph
 
 # parser = argparse.ArgumentParser(description='select file')
 # parser.add_argument('-i', '--input', help='Full path to input file', required=True)
 # args = parser.parse_args()
 
+# columns of the analysis report, in order (see analyze_file)
+REPORT_FIELDS = [
+    'filename',
+    'PR length',
+    'LR count',
+    'LR lengths',
+    'LR angles',
+    'primary LR density',
+    'alpha',
+    'material cost',
+    'wiring cost',
+    'scaling distance to front',
+    'alpha (random)',
+    'material (random)',
+    'wiring (random)',
+    'scaling (random)',
+    'alpha percentiles (random)',
+    'scaling percentiles (random)',
+]
+
+# columns of the time series report, in order (see analyze_series)
+# LR lengths and angles are listed by series LR id, which stays the same from day to day (see track_LRs)
+SERIES_FIELDS = [
+    'plant',
+    'day',
+    'filename',
+    'PR length',
+    'LR count',
+    'total LR length',
+    'LR lengths',
+    'LR angles',
+    'alpha',
+    'material cost',
+    'wiring cost',
+    'scaling distance to front',
+]
+
+# file names TracerUI.make_file gives each frame of a GIF: <source>_plant<ID>_day<N>
+SERIES_NAME = re.compile(r'^(?P<plant>.+_plant[^_]+)_day(?P<day>\d+)$')
+
+# percentiles of the random trees' alphas and scaling distances in the report
+RANDOM_PERCENTILES = [5, 25, 50, 75, 95]
+
 def distance(p1, p2):
     '''Compute 2D Euclidian distance between two (x,y) points.'''
     return math.sqrt((p1[0]-p2[0])**2 + (p1[1]-p2[1])**2)
 
-def make_graph(target):
-    '''Construct graph from file and check for errors.'''
-    G = nx.Graph()
-    with open(target, "r") as f: # parse input file
-        q = Queue()
-        node_num = 1 # label nodes with unique identifiers
-        for line in f:
+# children of a node in the .xyz format: [level,group] pairs, with group counting from 0 within each level
+CHILD_REF = re.compile(r'\[\s*(-?\d+)\s*,\s*(-?\d+)\s*\]')
+
+# a problem found while parsing a .xyz file
+# kind is one of 'mismatch' (a node isn't the child its parent's hierarchy info said comes next),
+# 'orphan' (nothing claims the node as a child), 'missing' (a child that isn't in the file),
+# 'duplicate' (a child claimed twice) or 'cycle'. line is the line number in the file, node
+# is the node's number in the graph (as labelled by make_graph), and message describes it
+ParseError = namedtuple('ParseError', ['kind', 'line', 'node', 'message'])
+
+def parse_xyz(target, repair=False):
+    '''
+    Read a file in the .xyz format into arrays, in one pass.
+
+    Returns (coords, parent, errors): coords is an (n, 2) int array of node positions, in file
+    order, parent[i] is the row of node i's parent (-1 for the top node and for any node that
+    couldn't be attached), and errors is a list of ParseErrors.
+
+    By default (strict mode), each node's parent is the next one waiting in line, as make_graph
+    has always done it, and a node that isn't the child that parent expected is left unattached.
+    With repair=True, each child is instead looked up by the level and group its parent gave for
+    it, which reattaches nodes after a slip in the ordering; only what can't be resolved that
+    way is reported.
+    '''
+    coords = []
+    parent = []
+    errors = []
+    # where each node sits in the file, and what it said its children were (for repairs)
+    lines = []
+    places = {}
+    children_of = []
+    # nodes are listed level by level, so children are met in the order their parents
+    # announce them: each entry is (parent row, [level, group] the child should have)
+    expected = deque()
+    level = None
+
+    with open(target, "r") as f:
+        for line_num, line in enumerate(f, 1):
             if line.startswith("##"): # Level heading
-                group_num = 0 # count nodes per level, and reset on level change, to match hierarchy info from tuples
+                group_num = 0 # count nodes per level, and reset on level change, to match hierarchy info
                 level = int(line.rstrip().split(": ")[1])
                 continue
+            if not line.strip():
+                continue
+            if level is None:
+                raise ValueError(f"{target}, line {line_num}: node listed before any level heading")
+
+            info, _, rest = line.partition(";")
+            row = len(coords)
+            coords.append([int(float(i)) for i in info.split()[0:2]]) # change output coords from floats to ints
+            # metadata in parentheses, e.g. (PR, None), is ignored
+            children = [[int(l), int(g)] for l, g in CHILD_REF.findall(rest)]
+
+            if repair:
+                lines.append((line_num, line))
+                places[(level, group_num)] = row
+                children_of.append(children)
+                parent.append(-1)
+            elif not expected:
+                # only the top node should have no parent waiting for it
+                parent.append(-1)
+                if row > 0:
+                    errors.append(ParseError('orphan', line_num, row + 1, f"Edge assignment failed: no parent for node {row + 1}; {level}; {group_num}; {line.rstrip().split('; ')}"))
             else:
-                info = line.rstrip().split("; ")
-
-                coords = tuple(int(float(i)) for i in info[0].split())[0:2] # change output coords from floats to ints
-                metadata = re.findall(r'\(.+?\)|\[.+?\]', info[1]) # find chunks in brackets or parenthesis
-
-                root_metadata = metadata[-1] # eg (PR, None)
-                child_metadata = [] # eg ['[1,0]']
+                p, (parent_level, parent_group) = expected.popleft()
+                if level == parent_level and group_num == parent_group:
+                    parent.append(p)
+                else:
+                    parent.append(-1)
+                    errors.append(ParseError('mismatch', line_num, row + 1, f"Edge assignment failed: {(p + 1, [parent_level, parent_group])}; {level}; {group_num}; {line.rstrip().split('; ')}"))
 
-                for el in metadata:
-                    if el != root_metadata:
-                        child_metadata.append(el)
-                
-                if not child_metadata: # terminal node, no children
-                    G.add_node(node_num, pos=coords)
-                    parent = q.get()
+            for child in children:
+                expected.append((row, child))
 
-                    parent_level = parent[1][0]
-                    parent_group = parent[1][1]
+            group_num += 1
 
-                    if level == parent_level and group_num == parent_group:
-                        G.add_edge(node_num, parent[0], length=distance(G.nodes[node_num]['pos'], G.nodes[parent[0]]['pos']))
-                    else:
-                        print("ERROR: edge assignment failed (terminal node)")
+    if repair:
+        repair_parents(parent, places, children_of, lines, errors)
 
-                else:
-                    G.add_node(node_num, pos=coords)
+    return np.array(coords, dtype=int).reshape(-1, 2), np.array(parent, dtype=int), errors
 
-                    if not q.empty():
-                        parent = q.get()
 
-                        parent_level = parent[1][0]
-                        parent_group = parent[1][1]
+def repair_parents(parent, places, children_of, lines, errors):
+    '''
+    Fill in parent (in place) by looking up every child where its parent said it would be,
+    then detach whatever would close a cycle. Problems are appended to errors.
+    '''
+    for row, children in enumerate(children_of):
+        for level, group in children:
+            child = places.get((level, group))
+            line_num, line = lines[row]
+            if child is None:
+                errors.append(ParseError('missing', line_num, row + 1, f"Child [{level},{group}] of node {row + 1} is not in the file; {line.rstrip().split('; ')}"))
+            elif child == 0:
+                errors.append(ParseError('duplicate', line_num, row + 1, f"The top node, at [{level},{group}], is claimed as a child by node {row + 1}; {line.rstrip().split('; ')}"))
+            elif parent[child] != -1:
+                errors.append(ParseError('duplicate', line_num, row + 1, f"Node {child + 1} at [{level},{group}] is claimed by node {row + 1} as well as node {parent[child] + 1}; {line.rstrip().split('; ')}"))
+            else:
+                parent[child] = row
+
+    # walk up from every node; a walk that comes back on itself is a cycle, broken at that node
+    state = [0] * len(parent) # 0 = not seen yet, 1 = on the current walk, 2 = done
+    for row in range(len(parent)):
+        walk = []
+        curr = row
+        while curr != -1 and state[curr] == 0:
+            state[curr] = 1
+            walk.append(curr)
+            curr = parent[curr]
+        if curr != -1 and state[curr] == 1:
+            line_num, line = lines[curr]
+            errors.append(ParseError('cycle', line_num, curr + 1, f"Node {curr + 1} is its own ancestor; {line.rstrip().split('; ')}"))
+            parent[curr] = -1
+        for node in walk:
+            state[node] = 2
+
+    for row in range(1, len(parent)):
+        if parent[row] == -1:
+            line_num, line = lines[row]
+            errors.append(ParseError('orphan', line_num, row + 1, f"Edge assignment failed: no parent for node {row + 1}; {line.rstrip().split('; ')}"))
+
+    errors.sort(key=lambda e: e.line)
+
+
+def graph_from_arrays(coords, parent):
+    '''
+    Build the graph make_graph returns from the arrays parse_xyz returns.
+    Nodes are numbered from 1, in file order, and every edge gets its "length".
+    '''
+    G = nx.Graph()
+    G.add_nodes_from((i + 1, {'pos': (x, y)}) for i, (x, y) in enumerate(coords.tolist()))
 
-                        if level == parent_level and group_num == parent_group:
-                            G.add_edge(node_num, parent[0], length=distance(G.nodes[node_num]['pos'], G.nodes[parent[0]]['pos']))
-                        else:
-                            print("Error: edge assignment failed")
-                        
-                    for child in child_metadata:
-                        q.put(
-                            (node_num, list(map(int, child.strip('[]').split(','))))
-                        )
+    child = np.flatnonzero(parent != -1)
+    # same arithmetic as distance(), so lengths match the ones make_graph has always given
+    lengths = np.sqrt(((coords[child] - coords[parent[child]]) ** 2).sum(axis=1))
+    G.add_edges_from(zip((child + 1).tolist(), (parent[child] + 1).tolist(), ({'length': l} for l in lengths.tolist())))
+    return G
 
-                node_num += 1
-                group_num += 1
 
-    #return "Done!" (used for csv creation)
-    return G
+def make_graph(target, repair=False):
+    '''
+    Construct graph from file and check for errors (see parse_xyz for what repair does).
+    Nodes that can't be attached are left out of the tree, and each problem is printed.
+    '''
+    coords, parent, errors = parse_xyz(target, repair=repair)
+    for error in errors:
+        print(error.message)
+    return graph_from_arrays(coords, parent)
 
 
 # G = make_graph('/Users/kianfaizi/projects/ariadne/color-final_plantA_day1.txt')
 
 def make_graph_alt(target):
     '''Construct a broken graph (without problematic edges).'''
-    G = nx.Graph()
-    with open(target, "r") as f: # parse input file
-        q = Queue()
-        node_num = 1 # label nodes with unique identifiers
-        for line in f:
-            if line.startswith("##"): # Level heading
-                group_num = 0 # count nodes per level, and reset on level change, to match hierarchy info from tuples
-                level = int(line.rstrip().split(": ")[1])
-                continue
-            else:
-                info = line.rstrip().split("; ")
-                if len(info) > 1: # node has degree > 1
-                    coords = tuple(int(float(i)) for i in info[0].split())[0:2] # change output coords from floats to ints
-                    G.add_node(node_num, pos = coords)
-                    if not q.empty():
-                        parent = q.get()
-                        # print(parent, level, group_num, info)
-                        if level == parent[1][0] and group_num == parent[1][1]: # check that the expected and actual positions of the child match
-                            G.add_edge(node_num, parent[0], length = distance(G.nodes[node_num]['pos'], G.nodes[parent[0]]['pos']))
-                        else:
-                            print(f"Edge assignment failed: {parent}; {level}; {group_num}; {info}")
-                    # place all descendants of the current node in the queue for processing in future rounds
-                    children = info[1].split()
-                    for child in children:
-                        q.put((node_num, list(map(int, child.strip('[]').split(','))))) # converts each child object from list of strings to list of ints
-                else: # terminal node (degree == 1)
-                    coords = tuple(int(float(i)) for i in info[0].rstrip(";").split())[0:2]
-                    G.add_node(node_num, pos = coords)
-                    children = None
-                    parent = q.get()
-                    if level == parent[1][0] and group_num == parent[1][1]:
-                        G.add_edge(node_num, parent[0], length = distance(G.nodes[node_num]['pos'], G.nodes[parent[0]]['pos']))
-                    else:
-                        print("Edge assignment failed: terminal node.")
-                node_num += 1
-                group_num += 1
-    return G
+    # make_graph has the same strict behaviour now, for files with or without metadata
+    return make_graph(target)
+
+
+def validate(target):
+    '''
+    Check a .xyz file in strict mode. Returns (is_intact, details) as in graph_results.csv:
+    'y' and 'Done!' for an intact file, or 'n' and the first problem found.
+    '''
+    try:
+        _, _, errors = parse_xyz(target)
+    except (OSError, ValueError, IndexError) as e:
+        return 'n', f"Could not parse file: {e!r}"
+    if errors:
+        return 'n', errors[0].message
+    return 'y', 'Done!'
+
+
+# binary tree format: one record per node, with node i in row i
+# pos is relative to the top node, parent is -1 for the top node, and -1 stands in for None in LR_index and root_deg
+TREE_DTYPE = np.dtype([('pos', '<f8', (2,)), ('parent', '<i8'), ('LR_index', '<i8'), ('root_deg', '<i8')])
+
+def save_tree(DG, dest):
+    '''
+    Save a tree (a DiGraph from parent to child, as TracerUI.make_file builds it) to dest as a
+    .npy file of TREE_DTYPE records, which load_tree can memory-map.
+    '''
+    rows = {node: i for i, node in enumerate(DG.nodes)}
+    tree = np.zeros(len(rows), dtype=TREE_DTYPE)
+    tree['parent'] = -1
+    for node, i in rows.items():
+        data = DG.nodes[node]
+        tree[i] = (data['pos'], tree['parent'][i], -1 if data['LR_index'] is None else data['LR_index'],
+                   -1 if data['root_deg'] is None else data['root_deg'])
+    for u, v in DG.edges:
+        tree['parent'][rows[v]] = rows[u]
+    np.save(dest, tree)
+
+
+def load_tree(path):
+    '''Memory-map a tree saved by save_tree. Nothing is read until it is used.'''
+    tree = np.load(path, mmap_mode='r')
+    assert tree.dtype == TREE_DTYPE
+    return tree
+
+
+def tree_to_graph(tree):
+    '''Build the same DiGraph the JSON format holds out of a tree from load_tree.'''
+    DG = nx.DiGraph()
+    DG.add_nodes_from((i, {'pos': list(pos), 'LR_index': None if LR_index == -1 else LR_index,
+                           'root_deg': None if root_deg == -1 else root_deg})
+                      for i, (pos, _, LR_index, root_deg) in enumerate(tree.tolist()))
+    parent = np.asarray(tree['parent'])
+    child = np.flatnonzero(parent != -1)
+    DG.add_edges_from(zip(parent[child].tolist(), child.tolist()))
+    return DG
+
+
+def tree_pareto_inputs(tree, excluded=None):
+    '''
+    Get the ParetoContext and the actual (wiring cost, conduction delay) of a tree from load_tree,
+    straight from its arrays, to hand to pareto_calcs without going through a graph (see analyze).
+    The rows in excluded (e.g. from measure_tree) are left out, as analyze leaves them out of a graph.
+    '''
+    pos = np.asarray(tree['pos'])
+    parent = np.asarray(tree['parent'])
+    if excluded is not None and len(excluded) > 0:
+        keep = np.ones(len(parent), dtype=bool)
+        keep[excluded] = False
+        # whatever is left has to still hang together (graph_costs checks the same)
+        assert keep[parent[keep & (parent != -1)]].all()
+        row = np.cumsum(keep) - 1
+        pos, parent = pos[keep], np.where(parent == -1, -1, row[parent])[keep]
+    ctx = ParetoContext.from_arrays(pos, parent)
+
+    length = np.zeros(len(parent))
+    child = parent != -1
+    length[child] = np.sqrt(((pos[child] - pos[parent[child]]) ** 2).sum(axis=1))
+    actual = tree_costs(parent, length, critical=np.delete(ctx.critical_nodes, ctx.root))
+    return ctx, actual
+
 
 def save_plot(path, name, title):
     '''Plot a Pareto front and save to .jpg.'''
@@ -182,8 +363,8 @@ def save_plot(path, name, title):
 # show_skel('/Users/kianfaizi/projects/ariadne/color-final_plantB_day1.txt')
 # pickle_test('/Users/kianfaizi/projects/ariadne/color-final_plantE_day1.txt')
 
-def calc_len_PR(G, root_node):
-    '''For a given graph and the uppermost node, calculate the PR length.'''
+def calc_len_PR(G, root_node, weights=None):
+    '''For a given graph and the uppermost node, calculate the PR length (see calc_root_len for weights).'''
     bfs_paths = dict(nx.bfs_successors(G, root_node))
 
     PRs = [] # list of PR nodes in order of increasing depth
@@ -199,162 +380,263 @@ def calc_len_PR(G, root_node):
     PRs.append(final)
 
     # calculate pairwise Euclidean distances and sum
-    return calc_root_len(G, PRs)
+    return calc_root_len(G, PRs, weights)
 
 
-def calc_root_len(G, nodes):
-    '''Return the pairwise Euclidean distance along a list of consecutive nodes.'''
+def calc_root_len(G, nodes, weights=None):
+    '''
+    Return the pairwise Euclidean distance along a list of consecutive nodes.
+    If a weights dict is given, each edge's length is also stored in it, as (prev, curr) : length.
+    '''
     dist = 0
 
     # order matters! assumes consecutive, increasing depth
     for prev, curr in zip(nodes, nodes[1:]):
         segment = distance(G.nodes[prev]['pos'], G.nodes[curr]['pos'])
         dist += segment
-        # might as well annotate the edges while I'm here
-        G.edges[prev, curr]['weight'] = segment
+        # might as well note the edge lengths while I'm here
+        if weights is not None:
+            weights[prev, curr] = segment
 
     return dist
 
 
-def calc_len_LRs(H):
-    '''Find the total length of each LR type in the graph.'''    
+def measure_LRs(p2, p3, LRs, first, known=None):
+    '''
+    Measure LRs from their edges, given in order of increasing depth: p2 and p3 hold the positions
+    of each edge's parent and child, LRs the LR index of its child, and first is True for the
+    edges that join an LR to its branch point. known is as in calc_len_LRs.
+    Returns ({LR index : [length, angle]}, the length of each edge, the set of LRs below the length threshold).
+    '''
     # minimum length (px) for LR to be considered part of the network
     # based on root hair emergence times
     # threshold = 117
     threshold = 0
 
-    # dict of node ids : LR index, for each LR node
-    idxs = nx.get_node_attributes(H, 'LR_index')
-    idxs = {k:v for k,v in idxs.items() if v is not None} # drop empty (PR) nodes
-
-    num_LRs = max(idxs.values()) + 1
+    # segment lengths, summed per LR in depth order (as calc_root_len would)
+    delta = p3 - p2
+    segments = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)
+    num_LRs = LRs.max() + 1
+    edge_lengths = segments
+
+    # known LRs are left out from here on
+    todo = np.ones(num_LRs, dtype=bool)
+    if known:
+        todo[list(known)] = False
+        new = todo[LRs]
+        LRs, first, delta, segments = LRs[new], first[new], delta[new], segments[new]
+    lengths = np.bincount(LRs, weights=segments, minlength=num_LRs).tolist()
+
+    # each LR should have exactly one branch point
+    assert (np.bincount(LRs[first], minlength=num_LRs)[todo] == 1).all()
+
+    # now we can calculate the gravitropic set point angles, from each branch point (p2) to the first LR node (p3).
+    # recall: in our coordinate system, the top node is (0,0)
+    # x increases to the right; y increases downwards,
+    # so the cosine of the angle between LR emergence and the vector of gravity [0,1] is the y component of the unit vector.
+    # this will be symmetric, whichever side of the PR the LR is on
+    norm_lr = segments[first]
+    assert (norm_lr > 0).all()
+    thetas = np.empty(num_LRs)
+    # (math.acos rather than np.arccos, which can be an ulp off and change the reported angles)
+    cos_theta = (delta[first, 1] / norm_lr).tolist()
+    thetas[LRs[first]] = np.rad2deg([math.acos(c) for c in cos_theta])
 
     results = {}
-
+    short = set()
     for i in range(num_LRs):
-        # gather nodes corresponding to the current LR index
-        selected = []
-
-        for node in H.nodes(data='LR_index'):
-            if node[1] == i:
-                selected.append(node[0])
-                # make note of the root degree (should be the same for all nodes in loop)
-                current_degree = H.nodes[node[0]]['root_deg']
-        
-        # to find the shallowest node in LR, we iterate through them
-        # until we find the one whose parent has a lesser root degree
-        sub = H.subgraph(selected)
-        for node in sub.nodes():
-            parent = list(H.predecessors(node))
-            # print(node, parent)
-            assert len(parent) == 1 # should be a tree
-            if H.nodes[parent[0]]['root_deg'] < current_degree:
-                sub_top = node
-
-        # now we can DFS to order all nodes by increasing depth
-        ordered = list(nx.dfs_tree(sub, sub_top).nodes())
-
-        # also include the parent of the shallowest node in the LR (the 'branch point')
-        parent = list(H.predecessors(ordered[0]))
-        assert len(parent) == 1
-
-        nodes_list = parent + ordered
-
-        length = calc_root_len(H, nodes_list)
-
-        if length < threshold:
-            H.remove_nodes_from(ordered)
+        if not todo[i]:
+            results[i] = list(known[i])
+        elif lengths[i] < threshold:
+            short.add(i)
         else:
-            # now we can calculate the gravitropic set point angle
-            # branch coordinates
-            p2 = np.array(H.nodes[parent[0]]['pos'])
-            # LR coordinates
-            p3 = np.array(H.nodes[ordered[0]]['pos'])
-
-            # recall: in our coordinate system, the top node is (0,0)
-            # x increases to the right; y increases downwards
-            # unit vector of gravity
-            g = np.array([0,1])
-            # normalized vector of LR emergence
-            lr = p3 - p2
-            norm_lr = np.linalg.norm(lr)
-            assert norm_lr > 0
-            lr = lr/norm_lr
-
-            # angle between LR emergence and the vector of gravity:
-            # this will be symmetric, whichever side of the PR the LR is on
-            theta = np.rad2deg(math.acos(np.dot(lr,g)))
-
-            # print(f'The ordered list of nodes that make up LR #{i} is:', nodes_list)
-            results[i] = [length, theta]
-
-    assert nx.is_tree(H)
+            results[i] = [lengths[i], thetas[i]]
+
+    return results, edge_lengths, short
+
+
+def calc_len_LRs(H, weights=None, excluded=None, known=None):
+    '''
+    Find the total length of each LR type in the graph.
+    H isn't modified: edge lengths are stored in weights (as in calc_root_len), and the nodes of
+    LRs below the length threshold are added to the set excluded, if given.
+    known is an optional dict of {LR index : [length, angle]} for LRs that were measured before
+    and haven't changed since (e.g. on the previous day of a time series); only the other LRs are measured.
+    '''
+    idxs = dict(H.nodes(data='LR_index'))
+    pos = dict(H.nodes(data='pos'))
+    top = next(node for node, degree in H.in_degree() if degree == 0)
+
+    # a single BFS from the top gives every LR edge (parent, child) in order of increasing depth.
+    # an edge whose parent isn't in the same LR joins the LR to its branch point
+    edges = [(u, v) for u, v in nx.bfs_edges(H, top) if idxs[v] is not None]
+    if not edges:
+        return {}
+    parents, children = zip(*edges)
+    LRs = np.array([idxs[v] for v in children])
+    first = np.array([idxs[u] != idxs[v] for u, v in edges])
+
+    p2 = np.array([pos[u] for u in parents], dtype=float)
+    p3 = np.array([pos[v] for v in children], dtype=float)
+    results, segments, short = measure_LRs(p2, p3, LRs, first, known)
+
+    # note the edge lengths while I'm here
+    if weights is not None:
+        weights.update(zip(edges, segments.tolist()))
+
+    if short and excluded is not None:
+        excluded.update(v for v, i in zip(children, LRs.tolist()) if i in short)
+
     return results
     # add LR_index awareness: all, 1 deg, 2 deg, n deg
 
 
+def measure_tree(tree, known=None):
+    '''
+    Measure the PR and LRs of a tree from load_tree straight from its arrays, as calc_len_PR and
+    calc_len_LRs measure a graph (known is as in calc_len_LRs).
+    Returns (PR length, {LR index : [length, angle]}, rows of the LRs below the length threshold).
+    '''
+    pos = np.asarray(tree['pos'])
+    parent = np.asarray(tree['parent'])
+    LR_index = np.asarray(tree['LR_index'])
+
+    # check that the arrays hold a single tree, topped by node 0 (as analyze checks a graph)
+    levels = tree_levels(parent)
+    assert len(levels[0]) == 1 and levels[0][0] == 0 and sum(map(len, levels)) == len(parent)
+
+    # every edge, by its child, in order of increasing depth (as a BFS from the top gives them)
+    rows = np.concatenate(levels[1:]) if len(levels) > 1 else np.zeros(0, dtype=int)
+    on_PR = LR_index[rows] == -1
+
+    # PR edges, summed in depth order (as calc_root_len does)
+    child = rows[on_PR]
+    delta = pos[child] - pos[parent[child]]
+    len_PR = sum(np.sqrt(delta[:, 0]**2 + delta[:, 1]**2).tolist())
+
+    child = rows[~on_PR]
+    if len(child) == 0:
+        return len_PR, {}, child
+    LRs = LR_index[child]
+    first = LR_index[parent[child]] != LRs
+    LR_info, _, short = measure_LRs(pos[parent[child]], pos[child], LRs, first, known)
+    return len_PR, LR_info, child[np.isin(LRs, list(short))]
+
+
 def calc_density_LRs(G):
     pass    
     # add up to _n_ degrees
 
 
+# everything plot_all needs to draw a plant's Pareto plot, so plots can be drawn later or in another process
+ParetoPlot = namedtuple('ParetoPlot', ['front', 'actual', 'randoms', 'mrand', 'srand', 'dest'])
+
 def plot_all(front, actual, randoms, mrand, srand, dest):
-    fig = plt.figure()
+    '''
+    Draw the Pareto front, the actual tree, the random trees and their centroid, and save to dest.
+    The figure is drawn straight onto an Agg canvas, outside of pyplot, so nothing is left open afterwards.
+    '''
+    fig = Figure()
+    FigureCanvasAgg(fig)
     ax = fig.add_subplot(111)
     # ax.set_title(title)
     ax.set_xlabel("Total length (px)", fontsize=15)
     ax.set_ylabel("Travel distance (px)", fontsize=15)
 
-    plt.plot([x[0] for x in front.values()], [x[1] for x in front.values()], marker='s', linestyle='-', markeredgecolor='black')
-    plt.plot(actual[0], actual[1], marker='x', markersize=12)
-    for i in randoms:
-        plt.plot(i[0], i[1], marker='+', color='green', markersize=4)
+    ax.plot([x[0] for x in front.values()], [x[1] for x in front.values()], marker='s', linestyle='-', markeredgecolor='black')
+    ax.plot(actual[0], actual[1], marker='x', markersize=12)
+    # one collection for the whole ensemble, rather than a line per random tree
+    randoms = np.asarray(randoms, dtype=float).reshape(-1, 2)
+    ax.scatter(randoms[:, 0], randoms[:, 1], marker='+', color='green', s=4**2, linewidths=1)
 
-    plt.plot(mrand, srand, marker='+', color='red', markersize=12)
+    ax.plot(mrand, srand, marker='+', color='red', markersize=12)
 
-    plt.savefig(dest, bbox_inches='tight', dpi=300)
+    fig.savefig(dest, bbox_inches='tight', dpi=300)
     # plt.show()
 
 
-def distance_from_front(front, actual_tree):
+def distances_from_front(front, points):
     '''
-    Return the closest alpha for the actual tree, and its distance to the front.
+    Return the closest alpha for each of a number of trees, and their distances to the front, as two arrays.
 
-    actual_tree is just (mactual, sactual)
+    points is an array (or list) of (mcost, scost) rows, one per tree
     front is a dict of form {alpha : [mcost, scost]}
     '''
+    alphas = np.array(list(front))
+    front_costs = np.array(list(front.values()), dtype=float).reshape(-1, 2)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
 
-    # for each alpha value, find distance to the actual tree
-    distances = {}
-
-    for alpha in front.items():
-        alpha_value = alpha[0]
-        alpha_tree = alpha[1]
+    # for each tree (row) and alpha value (column), the factor by which the tree exceeds that alpha's front tree
+    material_ratio = points[:, [0]] / front_costs[:, 0]
+    transport_ratio = points[:, [1]] / front_costs[:, 1]
+    distances = np.maximum(material_ratio, transport_ratio)
 
-        material_ratio = actual_tree[0]/alpha_tree[0]
-        transport_ratio = actual_tree[1]/alpha_tree[1]
+    # the first alpha wins ties, as in distance_from_front
+    closest = distances.argmin(axis=1)
+    return alphas[closest], distances[np.arange(len(points)), closest]
 
-        distances[alpha_value] = max(material_ratio,transport_ratio)
 
-    # print(distances)
-    closest = min(distances.items(), key=lambda x:x[1])
-    # print(closest)
+def distance_from_front(front, actual_tree):
+    '''
+    Return the closest alpha for the actual tree, and its distance to the front.
 
-    characteristic_alpha, scaling_distance = closest
+    actual_tree is just (mactual, sactual)
+    front is a dict of form {alpha : [mcost, scost]}
+    '''
+    alphas, distances = distances_from_front(front, [actual_tree])
+    characteristic_alpha, scaling_distance = alphas[0], distances[0]
 
     return characteristic_alpha, scaling_distance
 
 
-def pareto_calcs(H):
-    '''Perform Pareto-related calculations.'''
-    front, actual = pareto_front(H)
+def save_randoms(front, randoms, dest):
+    '''Save the costs of each random tree, with its closest alpha and distance to the front, to a CSV file.'''
+    alphas, distances = distances_from_front(front, randoms)
+    with open(dest, 'w', encoding='utf-8', newline='') as csvfile:
+        w = csv.writer(csvfile)
+        w.writerow(['material cost', 'wiring cost', 'alpha', 'scaling distance to front'])
+        for (mcost, scost), alpha, scaling in zip(randoms, alphas.tolist(), distances.tolist()):
+            w.writerow([mcost, scost, alpha, scaling])
+
+
+def pareto_calcs(H, workers=1, adaptive=False, ctx=None, actual=None, cache=None):
+    '''
+    Perform Pareto-related calculations (spreading the Pareto front over `workers` processes).
+    If adaptive is True, the front is sampled with adaptive_front rather than on the fixed alpha grid.
+    ctx and actual (H's ParetoContext and its costs) can be passed in, e.g. from tree_pareto_inputs,
+    in which case H can be None.
+    If a cache (cache.ResultCache) is given, the front and random trees of a plant that has been
+    seen before are read from it instead of being computed again.
+    '''
+    # critical nodes, coordinates, etc. are shared by all the Pareto functions below
+    if ctx is None:
+        ctx = ParetoContext(H)
+    if actual is None:
+        actual = graph_costs(H, critical_nodes=set(ctx.critical_nodes.tolist()))
     mactual, sactual = actual
 
-    # for debug: show mcost, scost
-    # print(list(front.items())[0:5])
+    cached = None
+    if cache is not None:
+        key = pareto_key(ctx, actual, adaptive=adaptive, engine='array', randoms=1000)
+        cached = cache.get(key)
+
+    if cached is not None:
+        front, randoms = cached['front'], cached['randoms']
+        plant_alpha, plant_scaling = cached['alpha'], cached['scaling']
+    else:
+        if adaptive:
+            front, actual, plant_alpha, plant_scaling = adaptive_front(H, ctx=ctx, workers=workers, actual=actual)
+        else:
+            front, actual = pareto_front(H, ctx=ctx, workers=workers, actual=actual)
+            plant_alpha, plant_scaling = distance_from_front(front, actual)
+
+        # for debug: show mcost, scost
+        # print(list(front.items())[0:5])
 
-    plant_alpha, plant_scaling = distance_from_front(front, actual)
-    randoms = random_tree(H)
+        randoms = random_tree(H, ctx=ctx)
+
+        if cache is not None:
+            cache.put(key, {'front': front, 'actual': actual, 'randoms': randoms, 'alpha': plant_alpha, 'scaling': plant_scaling})
 
     # centroid of randoms
     mrand = np.mean([x[0] for x in randoms])
@@ -362,6 +644,9 @@ def pareto_calcs(H):
 
     rand_alpha, rand_scaling = distance_from_front(front, (mrand, srand))
 
+    # spread of the individual random trees around the front
+    rand_alphas, rand_scalings = distances_from_front(front, randoms)
+
     # assemble dict for export
     results = {
         'material cost' : mactual,
@@ -371,7 +656,9 @@ def pareto_calcs(H):
         'material (random)' : mrand,
         'wiring (random)' : srand,
         'alpha (random)' : rand_alpha,
-        'scaling (random)' : rand_scaling
+        'scaling (random)' : rand_scaling,
+        'alpha percentiles (random)' : np.percentile(rand_alphas, RANDOM_PERCENTILES).tolist(),
+        'scaling percentiles (random)' : np.percentile(rand_scalings, RANDOM_PERCENTILES).tolist(),
     }
 
     return results, front, randoms
@@ -379,18 +666,23 @@ def pareto_calcs(H):
     # [mactual, sactual, plant_alpha, plant_scaling, mrand, srand, rand_alpha, rand_scaling], front, actual, randoms, mrand, srand
 
 
-def analyze(G):
-    '''Report basic root metrics for a given graph.'''
+def measure_graph(G, known=None):
+    '''
+    Measure the roots of a graph for analyze (known is as in calc_len_LRs).
+    Returns (PR length, {LR index : [length, angle]}, the graph to take the Pareto front of, its ParetoContext, its actual costs).
+    '''
     # check that graph is indeed a tree (acyclic, undirected, connected)
     assert nx.is_tree(G)
 
-    # independent deep copy of G, with LRs below threshold excluded
-    H = copy.deepcopy(G)
+    # G is left as it is: edge lengths are kept in a dict of (parent, child) : length,
+    # and LRs below threshold are left out of a read-only view of G, rather than a copy
+    weights = {}
+    excluded = set()
 
     # print(G.nodes(data=True))
     
     # find top ("root") node
-    for node in H.nodes(data='pos'):
+    for node in G.nodes(data='pos'):
         # for some reason, this returns pos coords as a list and not a tuple. Didn't I save them as a tuple?
         if node[1] == [0,0]:
             root_node = node[0]
@@ -400,11 +692,36 @@ def analyze(G):
     assert root_node == 0
 
     # PR len
-    len_PR = calc_len_PR(H, root_node)
+    len_PR = calc_len_PR(G, root_node, weights)
     # print('PR length is:', len_PR)
 
     # LR len/number
-    LR_info = calc_len_LRs(H)
+    LR_info = calc_len_LRs(G, weights, excluded, known)
+
+    H = nx.restricted_view(G, excluded, []) if excluded else G
+    ctx = ParetoContext(H)
+    actual = graph_costs(H, critical_nodes=set(ctx.critical_nodes.tolist()), weights=weights)
+    return len_PR, LR_info, H, ctx, actual
+
+
+def analyze(G, workers=1, adaptive=False, cache=None, LRs=None, tree=None, known=None):
+    '''
+    Report basic root metrics for a given graph (see pareto_calcs for the keyword arguments).
+    If a dict is given as LRs, it's filled with each LR's {LR index : [length, angle]}, as from calc_len_LRs.
+    LRs already measured can be passed as known, in the same form, so they aren't measured again (see calc_len_LRs).
+    For a tree loaded from a .npy file, pass its arrays (from load_tree) as tree instead, and G can
+    be None: the roots are then measured and the Pareto inputs taken straight from the arrays
+    (see measure_tree and tree_pareto_inputs), without building a graph.
+    '''
+    if tree is not None:
+        len_PR, LR_info, excluded = measure_tree(tree, known)
+        H = None
+        ctx, actual = tree_pareto_inputs(tree, excluded)
+    else:
+        len_PR, LR_info, H, ctx, actual = measure_graph(G, known)
+
+    if LRs is not None:
+        LRs.update(LR_info)
     num_LRs = len(LR_info)
     lens_LRs = [x[0] for x in LR_info.values()]
     angles_LRs = [x[1] for x in LR_info.values()]
@@ -415,7 +732,7 @@ def analyze(G):
     density_LRs = num_LRs/len_PR
     # print('LR density is:', density_LRs)
 
-    results, front, randoms = pareto_calcs(H)
+    results, front, randoms = pareto_calcs(H, workers=workers, adaptive=adaptive, ctx=ctx, actual=actual, cache=cache)
 
     results['PR length'] = len_PR
     results['LR count'] = num_LRs
@@ -430,4 +747,172 @@ def analyze(G):
     # literally purchase a nice mouse for matt
     # add secondary LR density
     # add total root length.
-    # assert that the sum of PR and LR lengths == mactual, for sanity
\ No newline at end of file
+    # assert that the sum of PR and LR lengths == mactual, for sanity
+
+
+def load_file(path):
+    '''
+    Load a saved tree: a .json file from TracerUI.make_file, or its binary .npy copy. Returns
+    (graph, None) for a .json file, and (None, tree) for a .npy file, where tree is the memory-mapped
+    array from load_tree: analyze works on it as it is, and tree_to_graph builds the graph if it's needed.
+    '''
+    if str(path).endswith('.npy'):
+        return None, load_tree(path)
+    with open(path, mode='r') as h:
+        return json_graph.adjacency_graph(json.load(h)), None
+
+
+def report_dest(output_path, prefix='report'):
+    '''Path for a new analysis report in output_path, named after the current time.'''
+    timestamp = datetime.now()
+    return Path(output_path) / f"{prefix}_{str(timestamp.strftime('%Y%m%d_%H%M%S'))}.csv"
+
+
+def measure_file(path, output_path, workers=1, adaptive=False, cache=None):
+    '''
+    Analyze a saved tree and save its random trees (see save_randoms) to output_path as <name>_randoms.csv.
+    Returns the row for the report (a dict with the keys in REPORT_FIELDS) and the ParetoPlot
+    for <name>_pareto.png, which is left for the caller to draw with plot_all.
+    '''
+    name = Path(path).stem
+
+    G, tree = load_file(path)
+    results, front, randoms = analyze(G, workers=workers, adaptive=adaptive, cache=cache, tree=tree)
+    results['filename'] = name
+
+    save_randoms(front, randoms, Path(output_path) / f'{name}_randoms.csv')
+    plot = ParetoPlot(front, [results['material cost'], results['wiring cost']], randoms, results['material (random)'], results['wiring (random)'], Path(output_path) / f'{name}_pareto.png')
+
+    return results, plot
+
+
+def analyze_file(path, output_path, workers=1, adaptive=False, cache=None):
+    '''
+    Analyze a saved tree and save its Pareto plot to output_path as <name>_pareto.png,
+    and the random trees (see save_randoms) as <name>_randoms.csv.
+    Returns the row for the report (a dict with the keys in REPORT_FIELDS).
+    '''
+    results, plot = measure_file(path, output_path, workers=workers, adaptive=adaptive, cache=cache)
+
+    # make pareto plot and save
+    plot_all(*plot)
+
+    return results
+
+
+def group_series(paths):
+    '''
+    Group saved trees into time series, by source image and plant, from their file names (see SERIES_NAME).
+    Returns a dict of {plant : paths in order of increasing day}, with one file per day
+    (so pass either the .json files or their .npy copies). Files named otherwise are skipped.
+    '''
+    days = {}
+    for path in paths:
+        match = SERIES_NAME.match(Path(path).stem)
+        if match is None:
+            print(f'Skipping {Path(path).name}: not named <source>_plant<ID>_day<N>')
+            continue
+        days.setdefault(match['plant'], {})[int(match['day'])] = path
+
+    return {plant: [by_day[day] for day in sorted(by_day)] for plant, by_day in sorted(days.items())}
+
+
+def track_LRs(G, seen):
+    '''
+    Give each LR of G, one day of a time series, an id that stays the same from day to day.
+    Since the tree only grows, nodes carry over from the previous days at the same positions:
+    an LR keeps the id its nodes had before, and LRs that have just emerged get new ids.
+    seen maps the position of every LR node so far to its id, and is updated with G's LRs.
+    Returns a dict of {LR index : id}.
+    '''
+    ids = {}
+    taken = set() # an id can only go to one LR a day
+    for node, data in G.nodes(data=True):
+        i = data['LR_index']
+        if i is not None and i not in ids:
+            pos = tuple(data['pos'])
+            if pos in seen and seen[pos] not in taken:
+                ids[i] = seen[pos]
+                taken.add(seen[pos])
+
+    next_id = max(seen.values(), default=-1) + 1
+    for node, data in G.nodes(data=True):
+        i = data['LR_index']
+        if i is not None and i not in ids:
+            ids[i] = next_id
+            next_id += 1
+        if i is not None:
+            seen[tuple(data['pos'])] = ids[i]
+
+    return ids
+
+
+def LR_edges(G):
+    '''
+    Return each LR of G as the set of its edges, by position: {LR index : {(parent pos, child pos), ...}},
+    including the edge from its branch point. An LR's length and angle only depend on this set.
+    '''
+    edges = {}
+    for u, v in G.edges:
+        i = G.nodes[v]['LR_index']
+        if i is not None:
+            edges.setdefault(i, set()).add((tuple(G.nodes[u]['pos']), tuple(G.nodes[v]['pos'])))
+    return edges
+
+
+def analyze_plant(paths, workers=1, adaptive=False, cache=None):
+    '''
+    Analyze the days of one plant's time series (paths, in order of increasing day), carrying
+    the LR segmentation over from each day to the next. Yields a row per day, with the keys in SERIES_FIELDS.
+    LRs that haven't changed since the day before keep their measurements, and only new or grown
+    LRs are measured. Without a cache, a day that's unchanged from the day before reuses its
+    Pareto front and random trees (see cache.LastResult).
+    '''
+    if cache is None:
+        cache = LastResult()
+    seen = {}
+    measured = {} # id : (LR edges, [length, angle]) when last measured
+    for path in paths:
+        match = SERIES_NAME.match(Path(path).stem)
+        G, tree = load_file(path)
+        if G is None:
+            G = tree_to_graph(tree)
+        ids = track_LRs(G, seen)
+        shapes = LR_edges(G)
+        known = {i: measured[ids[i]][1] for i, edges in shapes.items() if ids[i] in measured and measured[ids[i]][0] == edges}
+
+        LRs = {}
+        results, front, randoms = analyze(G, workers=workers, adaptive=adaptive, cache=cache, LRs=LRs, tree=tree, known=known)
+        for i, LR in LRs.items():
+            measured[ids[i]] = (shapes[i], LR)
+
+        # LRs that haven't emerged yet (or were left out) have length 0, and no angle
+        lengths = [0] * len(set(seen.values()))
+        angles = [None] * len(lengths)
+        for i, (length, angle) in LRs.items():
+            lengths[ids[i]] = length
+            angles[ids[i]] = angle
+
+        yield {
+            'plant' : match['plant'],
+            'day' : int(match['day']),
+            'filename' : Path(path).stem,
+            'PR length' : results['PR length'],
+            'LR count' : results['LR count'],
+            'total LR length' : sum(lengths),
+            'LR lengths' : lengths,
+            'LR angles' : angles,
+            'alpha' : results['alpha'],
+            'material cost' : results['material cost'],
+            'wiring cost' : results['wiring cost'],
+            'scaling distance to front' : results['scaling distance to front'],
+        }
+
+
+def analyze_series(paths, workers=1, adaptive=False, cache=None):
+    '''
+    Analyze saved trees as time series (see group_series), yielding the growth trajectory of
+    each plant in turn: a row per day, with the keys in SERIES_FIELDS.
+    '''
+    for plant, days in group_series(paths).items():
+        yield from analyze_plant(days, workers=workers, adaptive=adaptive, cache=cache)
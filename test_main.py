@@ -0,0 +1,78 @@
+'''Tests for the tree operations behind the tracing UI (no window needed).'''
+
+import main
+
+
+def add(tree, parent, coords):
+    '''Add a node at coords as a child of parent (or as the top, if parent is None), as a click would.'''
+    tree.deselect_all()
+    if parent is not None:
+        parent.select()
+    node = main.Node(coords, None, None, tree)
+    tree.add_node(node, False)
+    return node
+
+
+def plant():
+    '''
+    A PR T-A-B, with an LR L-L2 branching off A, and a secondary LR S-S2 branching off L.
+    Returns the tree and its nodes by name.
+    '''
+    tree = main.Tree('plant.png')
+    nodes = {}
+    nodes['T'] = add(tree, None, (0, 0))
+    nodes['A'] = add(tree, nodes['T'], (0, 100))
+    nodes['B'] = add(tree, nodes['A'], (0, 200))
+    nodes['L'] = add(tree, nodes['A'], (100, 150))
+    nodes['L2'] = add(tree, nodes['L'], (200, 200))
+    nodes['S'] = add(tree, nodes['L'], (150, 300))
+    nodes['S2'] = add(tree, nodes['S'], (150, 400))
+    return tree, nodes
+
+
+def degrees(nodes):
+    return {name: n.root_degree for name, n in nodes.items()}
+
+
+def test_plant():
+    tree, nodes = plant()
+    assert degrees(nodes) == {'T': 0, 'A': 0, 'B': 0, 'L': 1, 'L2': 1, 'S': 2, 'S2': 2}
+    assert tree.check_LRs() == []
+
+
+def test_delete_LR_start():
+    # S now branches off the PR, so it's a primary LR
+    tree, nodes = plant()
+    before = degrees(nodes)
+    tree.delete_node(nodes['L'])
+    assert nodes['S'].parent is nodes['A']
+    assert degrees(nodes) == dict(before, S=1, S2=1)
+    assert tree.check_LRs() == []
+
+    # nodes added below S afterwards take its new degree
+    S3 = add(tree, nodes['S2'], (150, 500))
+    assert S3.root_degree == 1
+    assert tree.check_LRs() == []
+
+    tree.undo()
+    tree.undo()
+    assert degrees(nodes) == before
+    assert tree.check_LRs() == []
+
+    tree.redo()
+    assert degrees(nodes) == dict(before, S=1, S2=1)
+    assert tree.check_LRs() == []
+
+
+def test_delete_branch_point():
+    # deleting A leaves B on the PR and L as a primary LR, off T
+    tree, nodes = plant()
+    before = degrees(nodes)
+    tree.delete_node(nodes['A'])
+    assert nodes['B'].parent is nodes['L'].parent is nodes['T']
+    assert degrees(nodes) == before
+    assert tree.check_LRs() == []
+
+    tree.undo()
+    assert degrees(nodes) == before
+    assert tree.check_LRs() == []
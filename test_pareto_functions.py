@@ -0,0 +1,54 @@
+'''
+Regression checks for the Pareto engines: the trees they build on synthetic plants are pinned
+to the ones the original networkx version of pareto_steiner_fast built, so a change to an engine
+can't silently change its trees.
+'''
+
+import hashlib
+from functools import lru_cache
+
+import pytest
+
+import benchmark
+from pareto_functions import ParetoContext, graph_costs, pareto_steiner_fast, pareto_steiner_array
+
+# fingerprint of the tree the original pareto_steiner_fast built for the synthetic plant with
+# this many tips (seed 0) at each alpha, as {(tips, alpha) : fingerprint}
+TREES = {
+    (40, 0.1): '907e6ae23c9b9930fa5114b4f82f6f9ae8432d6b2c81be42a1935993f38f98d8',
+    (40, 0.5): '9012ededfc19d26d80e853b8c170fa7f681d813e631087eae9b7585960e5b0f6',
+    (40, 0.9): '32c6520ebc48b7e9e01a082a8f9bf0137d11e66a98fb6297a853889a3ce3d910',
+    (120, 0.1): '89ec0d53fd87f45b64e73fcf351677cc54e84598757c82740c32178aeb45e594',
+    (120, 0.5): '0f68cee01a69e060198dfeebfcaecaa5aa265911d682054dfe7af7ea89aefde1',
+    (120, 0.9): 'da0edce0dce8417751bef58815e364c2223ad3d8c30ae400a33981d1d4a06b8d',
+}
+
+
+@lru_cache()
+def plant(tips):
+    return benchmark.synthetic_root(tips, seed=0)
+
+
+def fingerprint(H):
+    '''Hash a tree's edges by the positions of their ends (to 6 decimals), whatever its node ids.'''
+    pos = {u: tuple(round(float(c), 6) + 0.0 for c in p) for u, p in H.nodes(data='pos')}
+    edges = sorted(tuple(sorted((pos[u], pos[v]))) for u, v in H.edges)
+    return hashlib.sha256(repr(edges).encode()).hexdigest()
+
+
+@pytest.mark.parametrize('tips, alpha', sorted(TREES))
+def test_fast(tips, alpha):
+    H = pareto_steiner_fast(plant(tips), alpha)
+    assert fingerprint(H) == TREES[tips, alpha]
+
+
+@pytest.mark.parametrize('tips, alpha', sorted(TREES))
+def test_array(tips, alpha):
+    G = plant(tips)
+    ctx = ParetoContext(G)
+    mcost, scost, H = pareto_steiner_array(G, alpha, build_tree=True, ctx=ctx)
+    assert fingerprint(H) == TREES[tips, alpha]
+
+    # the costs it reports are those of the tree it built
+    critical = set(ctx.critical_nodes.tolist())
+    assert (mcost, scost) == pytest.approx(graph_costs(H, critical_nodes=critical), rel=1e-12)